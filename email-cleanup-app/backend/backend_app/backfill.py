@@ -0,0 +1,180 @@
+import hashlib
+import json
+
+from sqlalchemy import text
+
+from backend_app.brands import brand_registry
+from backend_app.fingerprints import touch_brand
+from backend_app.merge import MASTER_VERSION, SCOPE_TABLE, merge_master, open_scope
+from backend_app.stats import rebuild_stats
+from backend_app.suppression import SUPPRESSION_VERSION
+from backend_app.validation import (
+    BRAND_RULES, CANONICAL_PROVIDERS, DEFAULT_RULES, PLUS_TAG_PROVIDERS, canonical_providers, rules_for
+)
+from backend_app.versions import bump_version
+
+MOVES_TABLE = "canonical_moves"
+# The rule settings canonicalization reads (see validation.canonical_providers)
+CANONICAL_RULE_KEYS = ("canonicalize", "plus_tag_providers", "extra_canonical_providers")
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def canonical_email_sql(providers, column="email"):
+    """SQL twin of ``canonicalize_emails`` for one provider table.
+
+    NULL for domains without a rule; callers restrict ``column`` to
+    single-``@`` values, the only ones the Python version rewrites.
+    """
+    cases = []
+    for domain, rule in providers.items():
+        local = f"split_part({column}, '@', 1)"
+        tag = rule.get("tag")
+        if tag:
+            # A leading tag would leave nothing; those stay as they are
+            pos = f"strpos({local}, {_literal(tag)})"
+            local = f"CASE WHEN {pos} > 1 THEN left({local}, {pos} - 1) ELSE {local} END"
+        if rule.get("dots"):
+            local = f"replace({local}, '.', '')"
+        cases.append(f"WHEN {_literal(domain)} THEN {local} || '@' || {_literal(rule.get('domain', domain))}")
+    return f"CASE split_part({column}, '@', 2) {' '.join(cases)} END"
+
+
+def _collect_moves(conn, table, providers):
+    """Fill MOVES_TABLE with (old, new) for rows of ``table`` not yet canonical."""
+    conn.execute(text(f"DROP TABLE IF EXISTS {MOVES_TABLE}"))
+    domains = ", ".join(_literal(d) for d in providers)
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {MOVES_TABLE} ON COMMIT DROP AS
+        SELECT old, new FROM (
+            SELECT email AS old, {canonical_email_sql(providers)} AS new
+            FROM {table}
+            WHERE email ~ '^[^@]+@[^@]+$' AND split_part(email, '@', 2) IN ({domains})
+        ) c
+        WHERE new <> old
+    """))
+    return conn.execute(text(f"SELECT COUNT(*) FROM {MOVES_TABLE}")).scalar()
+
+
+def _fold_brand_table(conn, table):
+    # Several spellings of one mailbox keep the row already stored under
+    # the canonical one, else the smallest spelling's row
+    conn.execute(text(f"""
+        DELETE FROM {table} t USING {MOVES_TABLE} c
+        WHERE t.email = c.old AND (
+            EXISTS (SELECT 1 FROM {table} x WHERE x.email = c.new)
+            OR EXISTS (SELECT 1 FROM {MOVES_TABLE} d WHERE d.new = c.new AND d.old < c.old)
+        )
+    """))
+    conn.execute(text(f"UPDATE {table} t SET email = c.new FROM {MOVES_TABLE} c WHERE t.email = c.old"))
+
+
+def _fold_master(conn):
+    # Same rules as a brand write into master: brand bits OR'd together,
+    # contact fields only fill gaps, an existing segment is kept
+    conn.execute(text(f"""
+        INSERT INTO master_emails (email, card_no, name, phone, brand_mask, last_updated)
+        SELECT c.new,
+            (array_agg(m.card_no ORDER BY c.old) FILTER (WHERE m.card_no IS NOT NULL))[1],
+            (array_agg(m.name ORDER BY c.old) FILTER (WHERE m.name IS NOT NULL))[1],
+            (array_agg(m.phone ORDER BY c.old) FILTER (WHERE m.phone IS NOT NULL))[1],
+            bit_or(m.brand_mask), MAX(m.last_updated)
+        FROM {MOVES_TABLE} c JOIN master_emails m ON m.email = c.old
+        GROUP BY c.new
+        ON CONFLICT (email) DO UPDATE SET
+            brand_mask = master_emails.brand_mask | EXCLUDED.brand_mask,
+            last_updated = GREATEST(master_emails.last_updated, EXCLUDED.last_updated),
+            card_no = COALESCE(master_emails.card_no, EXCLUDED.card_no),
+            name = COALESCE(master_emails.name, EXCLUDED.name),
+            phone = COALESCE(master_emails.phone, EXCLUDED.phone)
+    """))
+    conn.execute(text(f"""
+        INSERT INTO master_email_segments (email, brand, segment)
+        SELECT DISTINCT ON (c.new, s.brand) c.new, s.brand, s.segment
+        FROM {MOVES_TABLE} c JOIN master_email_segments s ON s.email = c.old
+        ORDER BY c.new, s.brand, c.old
+        ON CONFLICT (email, brand) DO NOTHING
+    """))
+    conn.execute(text(f"DELETE FROM master_email_segments s USING {MOVES_TABLE} c WHERE s.email = c.old"))
+    conn.execute(text(f"DELETE FROM master_emails m USING {MOVES_TABLE} c WHERE m.email = c.old"))
+
+
+def _add_canonical_suppressions(conn):
+    # The stored spelling stays listed; its canonical form is added so
+    # canonicalized uploads still match it
+    return conn.execute(text(f"""
+        INSERT INTO invalid_emails (email, brand, added_at)
+        SELECT DISTINCT ON (c.new) c.new, i.brand, NOW()
+        FROM {MOVES_TABLE} c JOIN invalid_emails i ON i.email = c.old
+        ORDER BY c.new, c.old
+        ON CONFLICT (email) DO NOTHING
+    """)).rowcount
+
+
+def canonical_backfill_name():
+    """Migration marker for the current canonicalization rules.
+
+    Built from the provider tables and the canonicalization settings only:
+    changing them gives a new name, so stored rows are folded again under
+    the new rules on the next start, while registering a brand does not.
+    """
+    rules = {
+        "providers": CANONICAL_PROVIDERS,
+        "plus_tag_providers": PLUS_TAG_PROVIDERS,
+        "default": {key: DEFAULT_RULES.get(key) for key in CANONICAL_RULE_KEYS},
+        "brands": {
+            brand: {key: overrides[key] for key in CANONICAL_RULE_KEYS if key in overrides}
+            for brand, overrides in BRAND_RULES.items()
+            if any(key in overrides for key in CANONICAL_RULE_KEYS)
+        },
+    }
+    digest = hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:16]
+    return f"migration:canonical_emails:{digest}"
+
+
+def backfill_canonical_emails(conn):
+    """Rewrite stored brand, master and invalid emails to their canonical spelling.
+
+    Uploads canonicalize before writing, so rows stored before that (or
+    under other rules) would never match again. Brand tables use their
+    brand's rules, master and the invalid list the default ones. Does not
+    commit.
+    """
+    folded = {}
+    open_scope(conn)
+    for brand in brand_registry.all(conn):
+        providers = canonical_providers(rules_for(brand.name))
+        moved = _collect_moves(conn, brand.table, providers) if providers else 0
+        if moved:
+            folded[brand.code] = moved
+            _fold_brand_table(conn, brand.table)
+            touch_brand(conn, brand.code)
+            conn.execute(text(f"""
+                INSERT INTO {SCOPE_TABLE} (email)
+                SELECT old FROM {MOVES_TABLE} UNION SELECT new FROM {MOVES_TABLE}
+                ON CONFLICT (email) DO NOTHING
+            """))
+    if folded:
+        # Old spellings leave master, canonical ones are recomputed from the brands
+        merge_master(conn, scoped=True)
+
+    providers = canonical_providers(DEFAULT_RULES)
+    master = suppressed = 0
+    if providers:
+        # Whatever is left came from direct master writes, not a brand table
+        master = _collect_moves(conn, "master_emails", providers)
+        if master:
+            _fold_master(conn)
+            bump_version(conn, MASTER_VERSION)
+        if _collect_moves(conn, "invalid_emails", providers):
+            suppressed = _add_canonical_suppressions(conn)
+            if suppressed:
+                bump_version(conn, SUPPRESSION_VERSION)
+    conn.execute(text(f"DROP TABLE IF EXISTS {MOVES_TABLE}"))
+
+    if master or suppressed:
+        rebuild_stats(conn)
+    if folded or master or suppressed:
+        print(f"🔁 Canonical emails backfilled: brands {folded}, master {master}, invalid +{suppressed}")
@@ -0,0 +1,87 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from backend_app.brands import brand_code
+from backend_app.database import SessionLocal
+from backend_app.fingerprints import touch_brand
+from backend_app.merge import discard_pending, merge_pending
+from backend_app.metrics import StageTimer
+from backend_app.parallel import PIPELINE_WORKERS
+from backend_app.pipeline import PipelineError, run_upload
+
+# Files of one batch processed at once, each on its own connection
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_STAGES = ["files", "master_merge"]
+
+
+def _upload_file(fileobj, filename, brand, mode, workers, batch_id):
+    db = SessionLocal()
+    try:
+        result = run_upload(db, fileobj, brand, mode=mode, workers=workers, batch_id=batch_id)
+        return {"filename": filename, **result}
+    except PipelineError as e:
+        db.rollback()
+        return {"filename": filename, "status": "failed", "brand": brand, **e.content}
+    except Exception as e:
+        db.rollback()
+        return {"filename": filename, "status": "failed", "brand": brand, "error": f"Upload failed: {str(e)}"}
+    finally:
+        db.close()
+
+
+def run_batch(db, uploads, mode="stream"):
+    """Load several brand files at once and merge master a single time.
+
+    ``uploads`` is a list of ``(fileobj, filename, brand)``, one per brand.
+    Each file runs the usual pipeline (fingerprint, clean, dedup, brand
+    write) in its own thread and transaction, without touching master;
+    the parallel parse/validate workers are shared out between the files.
+    Once every file is done, the emails the successful ones wrote are
+    merged into master in one transaction on ``db``. The files park those
+    emails in pending_merges under the batch's id, so none of them are
+    held in memory.
+
+    A failed file leaves its brand table as it was and does not stop the
+    others. If the final merge fails, the files' brand rows stay written
+    and their brand versions are bumped so the same files are reprocessed,
+    not replayed from the fingerprint cache, on the next upload.
+    """
+    timer = StageTimer("batch", BATCH_STAGES)
+    batch_id = uuid.uuid4().hex
+    file_workers = max(1, PIPELINE_WORKERS // len(uploads))
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(uploads)), thread_name_prefix="upload-batch") as pool:
+        files = list(pool.map(lambda upload: _upload_file(*upload, mode, file_workers, batch_id), uploads))
+    succeeded = [f for f in files if f["status"] == "success"]
+    timer.lap("files", rows=sum(f["rows_uploaded"] for f in succeeded))
+
+    merge_result = None
+    try:
+        merged = merge_pending(db, batch_id)
+        db.commit()
+        if merged is not None:
+            merge_result = {"status": "success", **merged}
+    except Exception as e:
+        db.rollback()
+        discard_pending(db, batch_id)
+        for f in succeeded:
+            if not f["cached"]:
+                touch_brand(db, brand_code(db, f["brand"]))
+        db.commit()
+        merge_result = {"status": "failed", "error": f"Master merge failed, run /merge-into-master: {str(e)}"}
+    timer.lap("master_merge", rows=merge_result.get("total", 0) if merge_result else 0)
+    timer.publish()
+
+    if not succeeded:
+        status = "failed"
+    elif len(succeeded) < len(files) or (merge_result and merge_result["status"] == "failed"):
+        status = "partial"
+    else:
+        status = "success"
+    return {
+        "status": status,
+        "mode": mode,
+        "files": files,
+        "merge_result": merge_result,
+        "timings": timer.report(),
+    }
@@ -0,0 +1,239 @@
+import re
+import threading
+from collections import namedtuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend_app.database import BRANDS_LOCK_ID, get_engine
+from backend_app.versions import bump_version, get_version
+
+BRANDS_VERSION = "brands"
+
+# Registered on first start, in this order. Bit order is also merge
+# priority: the first brand an email is in supplies its card_no/name/phone
+# on master_emails.
+DEFAULT_BRANDS = [
+    ("TR", "Tony Romas"),
+    ("MFM", "The Manhattan Fish Market"),
+    ("NYSS", "New York Steak Shack"),
+]
+
+# master_emails.brand_mask is a BIGINT; the sign bit is left alone
+MAX_BRANDS = 63
+CODE_PATTERN = re.compile(r"^[A-Z][A-Z0-9]{0,15}$")
+
+
+class BrandInfo(namedtuple("BrandInfo", "code name bit")):
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    @property
+    def table(self):
+        return brand_table(self.code)
+
+    @property
+    def member(self):
+        # Spelled exactly like the partial index predicate, so the planner
+        # can match the two
+        return f"(brand_mask & {self.mask}::bigint) <> 0"
+
+
+class BrandRegistry:
+    """In-process copy of the brands table.
+
+    Like the suppression cache, a lookup costs one primary-key read of
+    ``data_versions``; the table is re-read only after a brand was
+    registered (in any worker).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._brands = []
+
+    def all(self, db: Session):
+        """Registered brands in bit (priority) order."""
+        self._refresh(db)
+        return self._brands
+
+    def by_name(self, db: Session, name):
+        return next((b for b in self.all(db) if b.name == name), None)
+
+    def by_code(self, db: Session, code):
+        code = code.strip().upper()
+        return next((b for b in self.all(db) if b.code == code), None)
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def _refresh(self, db: Session):
+        version = get_version(db, BRANDS_VERSION)
+        with self._lock:
+            if self._version is not None and version == self._version:
+                return
+            rows = db.execute(text("SELECT code, name, bit FROM brands ORDER BY bit")).all()
+            self._brands = [BrandInfo(*row) for row in rows]
+            self._version = version
+
+
+brand_registry = BrandRegistry()
+
+
+def brand_code(db: Session, brand):
+    """Return the short code for a brand display name, or None if unknown."""
+    found = brand_registry.by_name(db, brand.strip()) if brand else None
+    return found.code if found else None
+
+
+def brand_table(code):
+    return f"emails_{code.lower()}"
+
+
+def parse_brand_codes(db: Session, codes):
+    """``"TR,MFM"`` -> registered brands; raises ValueError on an unknown code."""
+    brands = []
+    for code in (codes or "").split(","):
+        if not code.strip():
+            continue
+        found = brand_registry.by_code(db, code)
+        if found is None:
+            raise ValueError(f"Unknown brand code: {code.strip()}")
+        brands.append(found)
+    return brands
+
+
+def brand_fields(brands, brand_mask, segments):
+    """Per-brand ``segment_<code>``/``is_<code>`` fields of one master row."""
+    segments = segments or {}
+    fields = {}
+    for brand in brands:
+        fields[f"segment_{brand.code.lower()}"] = segments.get(brand.code)
+    for brand in brands:
+        fields[f"is_{brand.code.lower()}"] = bool(brand_mask & brand.mask)
+    return fields
+
+
+def create_brand_table(db, brand):
+    """The brand's own table (idempotent)."""
+    db.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {brand.table} (
+            email VARCHAR PRIMARY KEY,
+            card_no VARCHAR,
+            brand VARCHAR,
+            name VARCHAR,
+            phone VARCHAR,
+            segment VARCHAR
+        )
+    """))
+
+
+def create_brand_index(db, brand, concurrently=False):
+    """master_emails partial index for one brand (idempotent).
+
+    Serves brand-filtered keyset pages straight off the index. An index
+    left invalid by a failed concurrent build is dropped and built again.
+    ``concurrently`` needs an autocommit connection.
+    """
+    index = f"ix_master_emails_brand_{brand.code.lower()}"
+    invalid = db.execute(text("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :index AND c.relnamespace = current_schema()::regnamespace AND NOT i.indisvalid
+    """), {"index": index}).first()
+    if invalid:
+        db.execute(text(f"DROP INDEX {index}"))
+    db.execute(text(
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index} "
+        f"ON master_emails (last_updated DESC, email DESC) WHERE {brand.member}"
+    ))
+
+
+def build_brand_index(brand):
+    """Build a newly registered brand's index without blocking master writes.
+
+    CREATE INDEX CONCURRENTLY cannot run inside a transaction, so this uses
+    its own autocommit connection; call it once the registration commits.
+    If it fails, init_brands builds the index on the next start.
+    """
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        create_brand_index(conn, brand, concurrently=True)
+
+
+def register_brand(db: Session, code, name):
+    """Add a brand: registry row and brand table.
+
+    No migration is needed: membership is a bit of brand_mask and segments
+    live in master_email_segments. The master_emails index is left to
+    ``build_brand_index`` after the commit, so this transaction never holds
+    a build lock on master. Raises ValueError for a bad or taken code/name.
+    Does not commit.
+    """
+    code, name = code.strip().upper(), name.strip()
+    if not CODE_PATTERN.match(code):
+        raise ValueError("Brand code must be 1-16 letters or digits, starting with a letter.")
+    if not name:
+        raise ValueError("Brand name is required.")
+
+    db.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": BRANDS_LOCK_ID})
+    taken = db.execute(
+        text("SELECT 1 FROM brands WHERE code = :code OR name = :name"), {"code": code, "name": name}
+    ).first()
+    if taken:
+        raise ValueError("Brand code or name is already registered.")
+    bit = db.execute(text("SELECT COALESCE(MAX(bit) + 1, 0) FROM brands")).scalar()
+    if bit >= MAX_BRANDS:
+        raise ValueError(f"At most {MAX_BRANDS} brands can be registered.")
+
+    brand = BrandInfo(code, name, bit)
+    db.execute(
+        text("INSERT INTO brands (code, name, bit) VALUES (:code, :name, :bit)"),
+        {"code": code, "name": name, "bit": bit},
+    )
+    create_brand_table(db, brand)
+    bump_version(db, BRANDS_VERSION)
+    return brand
+
+
+def init_brands(conn):
+    """Seed the default brands and make sure every brand has its storage.
+
+    Databases from before the registry carried is_<code>/segment_<code>
+    columns on master_emails; they are folded into brand_mask and
+    master_email_segments, then dropped. BRANDS_VERSION is only bumped
+    when a brand was added or migrated, so restarting a worker does not
+    invalidate every cached brand lookup and response.
+    """
+    changed = False
+    for bit, (code, name) in enumerate(DEFAULT_BRANDS):
+        changed |= conn.execute(text(
+            "INSERT INTO brands (code, name, bit) VALUES (:code, :name, :bit) ON CONFLICT DO NOTHING"
+        ), {"code": code, "name": name, "bit": bit}).rowcount > 0
+    brands = [BrandInfo(*row) for row in conn.execute(text("SELECT code, name, bit FROM brands ORDER BY bit"))]
+    for brand in brands:
+        create_brand_table(conn, brand)
+        create_brand_index(conn, brand)
+
+    legacy = set(conn.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'master_emails'
+    """)).scalars())
+    for brand in brands:
+        flag, segment = f"is_{brand.code.lower()}", f"segment_{brand.code.lower()}"
+        if flag in legacy:
+            conn.execute(text(
+                f"UPDATE master_emails SET brand_mask = brand_mask | {brand.mask} WHERE {flag}"
+            ))
+            conn.execute(text(f"ALTER TABLE master_emails DROP COLUMN {flag}"))
+            changed = True
+        if segment in legacy:
+            conn.execute(text(f"""
+                INSERT INTO master_email_segments (email, brand, segment)
+                SELECT email, '{brand.code}', {segment} FROM master_emails WHERE {segment} IS NOT NULL
+                ON CONFLICT DO NOTHING
+            """))
+            conn.execute(text(f"ALTER TABLE master_emails DROP COLUMN {segment}"))
+            changed = True
+    if changed:
+        bump_version(conn, BRANDS_VERSION)
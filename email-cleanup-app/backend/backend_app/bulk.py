@@ -0,0 +1,289 @@
+import io
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend_app.metrics import record_statement
+
+BRAND_COLUMNS = ["card_no", "brand", "name", "phone", "email", "segment"]
+COPY_CHUNK_ROWS = 50_000
+
+
+def copy_dataframe(db: Session, df, table_name, columns, chunk_rows=COPY_CHUNK_ROWS):
+    """Stream ``df[columns]`` into ``table_name`` with PostgreSQL COPY.
+
+    Runs on the session's own connection, so the rows are part of the
+    current transaction (and visible to temp tables created in it).
+    Missing values are written as NULL.
+    """
+    raw = db.connection().connection
+    column_list = ", ".join(columns)
+    sql = f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '')"
+
+    with raw.cursor() as cur:
+        for start in range(0, len(df), chunk_rows):
+            buf = io.StringIO()
+            df[columns].iloc[start:start + chunk_rows].to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+            record_statement()
+    return len(df)
+
+
+def _stage_brand_rows(db: Session, df, table_name):
+    """COPY ``df`` into ``staging_<table>`` with each row's file position."""
+    staging = f"staging_{table_name}"
+    staged = df[BRAND_COLUMNS].copy()
+    staged["row_no"] = range(len(staged))
+
+    db.execute(text(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {staging} (
+            row_no BIGINT,
+            card_no TEXT, brand TEXT, name TEXT, phone TEXT, email TEXT, segment TEXT
+        ) ON COMMIT DROP
+    """))
+    db.execute(text(f"TRUNCATE {staging}"))
+    copy_dataframe(db, staged, staging, ["row_no"] + BRAND_COLUMNS)
+    return staging, staged
+
+
+def _file_counts(staged):
+    has_email = staged["email"].notna() & (staged["email"] != "")
+    distinct_emails = staged.loc[has_email, "email"].nunique()
+    return {
+        "staged": len(staged),
+        "distinct": int(distinct_emails),
+        "duplicates_in_file": int(has_email.sum()) - distinct_emails,
+        "missing_email": int((~has_email).sum()),
+    }
+
+
+# Latest row per email; on repeats the last one in the file wins
+_LATEST_ROWS = """
+    SELECT DISTINCT ON (email) card_no, brand, name, phone, email, segment
+    FROM {staging}
+    WHERE email IS NOT NULL AND email <> ''
+    ORDER BY email, row_no DESC
+"""
+
+
+def bulk_upsert_brand(db: Session, df, table_name):
+    """Upsert a brand DataFrame through a temp staging table.
+
+    Rows are COPY'd into ``staging_<table>`` together with their file
+    position, then applied with one ``INSERT ... ON CONFLICT``. When an
+    email appears more than once in the file the last row wins.
+    Does not commit.
+    """
+    staging, staged = _stage_brand_rows(db, df, table_name)
+
+    row = db.execute(text(f"""
+        WITH src AS ({_LATEST_ROWS.format(staging=staging)}),
+        upserted AS (
+            INSERT INTO {table_name} (card_no, brand, name, phone, email, segment)
+            SELECT card_no, brand, name, phone, email, segment FROM src
+            ON CONFLICT (email) DO UPDATE SET
+                card_no = EXCLUDED.card_no,
+                brand = EXCLUDED.brand,
+                name = EXCLUDED.name,
+                phone = EXCLUDED.phone,
+                segment = EXCLUDED.segment
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT
+            COUNT(*) FILTER (WHERE inserted) AS inserted,
+            COUNT(*) FILTER (WHERE NOT inserted) AS updated
+        FROM upserted
+    """)).one()
+
+    counts = _file_counts(staged)
+    counts.pop("distinct")
+    return {**counts, "inserted": row.inserted, "updated": row.updated}
+
+
+def bulk_upsert_master(db: Session, df, brand):
+    """Write one brand's rows straight into master_emails and its segments.
+
+    Same result as upserting row by row: the brand's bit is OR'd into
+    brand_mask, card_no/name/phone only fill values master does not have
+    yet, and the brand's segment is set, or removed for rows without one.
+    Rows are COPY'd into a staging table and applied in one statement; on
+    repeated emails the last row wins. ``brand`` is a BrandInfo.
+    Does not commit.
+    """
+    staging, _ = _stage_brand_rows(db, df.reindex(columns=BRAND_COLUMNS), "master_emails")
+
+    row = db.execute(text(f"""
+        WITH src AS ({_LATEST_ROWS.format(staging=staging)}),
+        upserted AS (
+            INSERT INTO master_emails (email, card_no, name, phone, brand_mask, last_updated)
+            SELECT email, card_no, name, phone, :mask, NOW() FROM src
+            ON CONFLICT (email) DO UPDATE SET
+                brand_mask = master_emails.brand_mask | EXCLUDED.brand_mask,
+                last_updated = NOW(),
+                card_no = COALESCE(master_emails.card_no, EXCLUDED.card_no),
+                name = COALESCE(master_emails.name, EXCLUDED.name),
+                phone = COALESCE(master_emails.phone, EXCLUDED.phone)
+            RETURNING (xmax = 0) AS inserted
+        ),
+        segments_set AS (
+            INSERT INTO master_email_segments (email, brand, segment)
+            SELECT email, :brand, segment FROM src WHERE segment IS NOT NULL
+            ON CONFLICT (email, brand) DO UPDATE SET segment = EXCLUDED.segment
+            RETURNING 1
+        ),
+        segments_removed AS (
+            DELETE FROM master_email_segments s
+            USING src
+            WHERE s.email = src.email AND s.brand = :brand AND src.segment IS NULL
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FILTER (WHERE inserted) FROM upserted) AS inserted,
+            (SELECT COUNT(*) FILTER (WHERE NOT inserted) FROM upserted) AS updated,
+            (SELECT COUNT(*) FROM segments_set) AS segments_set,
+            (SELECT COUNT(*) FROM segments_removed) AS segments_removed
+    """), {"mask": brand.mask, "brand": brand.code}).one()
+    return dict(row._mapping)
+
+
+def start_delta(db: Session, table_name):
+    """Open the staging table a delta upload collects its rows in.
+
+    It lives until the transaction ends, so a delta upload stages every
+    chunk and then calls ``apply_delta`` before committing.
+    """
+    staging = f"delta_{table_name}"
+    db.execute(text(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {staging} (
+            row_no BIGINT,
+            card_no TEXT, brand TEXT, name TEXT, phone TEXT, email TEXT, segment TEXT
+        ) ON COMMIT DROP
+    """))
+    db.execute(text(f"TRUNCATE {staging}"))
+
+
+def stage_delta(db: Session, df, table_name, first_row_no):
+    """COPY one chunk of a delta upload; row numbers continue across chunks."""
+    staged = df[BRAND_COLUMNS].copy()
+    staged["row_no"] = range(first_row_no, first_row_no + len(staged))
+    copy_dataframe(db, staged, f"delta_{table_name}", ["row_no"] + BRAND_COLUMNS)
+    return len(staged)
+
+
+def apply_delta(db: Session, table_name, scope_table):
+    """Make ``table_name`` mirror the staged upload, touching only differences.
+
+    The latest row per email is compared with the stored row: new emails
+    are inserted, changed ones updated, identical ones left alone, and
+    stored emails missing from the upload deleted. The emails touched are
+    added to ``scope_table`` (an existing ``email`` table, e.g. the merge
+    scope) in the same statement, so they never leave the database: they
+    are the only ones the master merge needs to recompute. Returns counts
+    only; ``changed`` is the number of emails touched. Does not commit.
+    """
+    staging = f"delta_{table_name}"
+    latest = f"delta_latest_{table_name}"
+    db.execute(text(f"DROP TABLE IF EXISTS {latest}"))
+    db.execute(text(f"""
+        CREATE TEMP TABLE {latest} ON COMMIT DROP AS
+        {_LATEST_ROWS.format(staging=staging)}
+    """))
+    db.execute(text(f"ALTER TABLE {latest} ADD PRIMARY KEY (email)"))
+    db.execute(text(f"ANALYZE {latest}"))
+
+    row = db.execute(text(f"""
+        WITH upserted AS (
+            INSERT INTO {table_name} (card_no, brand, name, phone, email, segment)
+            SELECT card_no, brand, name, phone, email, segment FROM {latest}
+            ON CONFLICT (email) DO UPDATE SET
+                card_no = EXCLUDED.card_no,
+                brand = EXCLUDED.brand,
+                name = EXCLUDED.name,
+                phone = EXCLUDED.phone,
+                segment = EXCLUDED.segment
+            WHERE ({table_name}.card_no, {table_name}.brand, {table_name}.name,
+                   {table_name}.phone, {table_name}.segment)
+                IS DISTINCT FROM
+                  (EXCLUDED.card_no, EXCLUDED.brand, EXCLUDED.name,
+                   EXCLUDED.phone, EXCLUDED.segment)
+            RETURNING email, (xmax = 0) AS inserted
+        ),
+        retired AS (
+            DELETE FROM {table_name} t
+            WHERE NOT EXISTS (SELECT 1 FROM {latest} l WHERE l.email = t.email)
+            RETURNING t.email
+        ),
+        scoped AS (
+            INSERT INTO {scope_table} (email)
+            SELECT email FROM upserted UNION SELECT email FROM retired
+            ON CONFLICT (email) DO NOTHING
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FILTER (WHERE inserted) FROM upserted) AS inserted,
+            (SELECT COUNT(*) FILTER (WHERE NOT inserted) FROM upserted) AS updated,
+            (SELECT COUNT(*) FROM retired) AS retired,
+            (SELECT COUNT(*) FROM scoped) AS changed
+    """)).one()
+
+    file_counts = db.execute(text(f"""
+        SELECT
+            COUNT(*) AS staged,
+            COUNT(*) FILTER (WHERE email IS NULL OR email = '') AS missing_email,
+            (SELECT COUNT(*) FROM {latest}) AS distinct_emails
+        FROM {staging}
+    """)).one()
+
+    return {
+        "staged": file_counts.staged,
+        "inserted": row.inserted,
+        "updated": row.updated,
+        "unchanged": file_counts.distinct_emails - row.inserted - row.updated,
+        "retired": row.retired,
+        "duplicates_in_file": file_counts.staged - file_counts.missing_email - file_counts.distinct_emails,
+        "missing_email": file_counts.missing_email,
+        "changed": row.changed,
+    }
+
+
+def bulk_insert_invalid(db: Session, email_chunks, brand):
+    """Add emails to invalid_emails in one set-based insert.
+
+    ``email_chunks`` is an iterable of normalized email Series; each is
+    COPY'd into a temp staging table as it arrives, so only one chunk is
+    held in memory. Emails already on the list are left untouched.
+    Does not commit.
+    """
+    staging = "staging_invalid_emails"
+    db.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (email TEXT) ON COMMIT DROP"))
+    db.execute(text(f"TRUNCATE {staging}"))
+
+    received = 0
+    for emails in email_chunks:
+        received += len(emails)
+        emails = emails.dropna()
+        emails = emails[emails != ""].drop_duplicates()
+        copy_dataframe(db, emails.to_frame("email"), staging, ["email"])
+
+    row = db.execute(text(f"""
+        WITH src AS (
+            SELECT DISTINCT email FROM {staging}
+        ),
+        inserted AS (
+            INSERT INTO invalid_emails (email, brand)
+            SELECT email, :brand FROM src
+            ORDER BY email  -- index order keeps btree inserts local
+            ON CONFLICT (email) DO NOTHING
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM src) AS distinct_emails,
+            (SELECT COUNT(*) FROM inserted) AS added
+    """), {"brand": brand}).one()
+
+    return {
+        "received": received,
+        "distinct": row.distinct_emails,
+        "added": row.added,
+        "already_present": row.distinct_emails - row.added,
+    }
@@ -0,0 +1,30 @@
+def normalize_emails(series):
+    # "string" dtype keeps missing values as <NA> instead of the text "nan"
+    return series.astype("string").str.strip().str.lower()
+
+def normalize_and_map_columns(df):
+    df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
+    column_aliases = {
+        "card_no": ["card_no", "card_number", "cardnum", "cardno", "card_no_"],
+        "brand": ["brand", "restaurant", "outlet"],
+        "name": ["name", "full_name", "customer_name"],
+        "phone": ["phone", "mobile", "mobile_number", "contact"],
+        "email": ["email", "email_address", "e-mail"],
+        "segment": ["segment", "segment_group", "group"]
+    }
+    for standard, aliases in column_aliases.items():
+        for alias in aliases:
+            if alias in df.columns and alias != standard:
+                df.rename(columns={alias: standard}, inplace=True)
+                break
+    return df
+
+def transform_frame(df, brand, code):
+    """Prefix segments with the brand code and stamp the brand name."""
+    df["segment"] = code + "_" + df["segment"].astype(str).str.strip()
+    df["brand"] = brand
+    return df
+
+def to_records(df):
+    """DataFrame rows as dicts with missing values as None (NaN is not valid JSON)."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
@@ -1,38 +1,178 @@
 import os
-import time
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import DBAPIError
 from .models import Base
+from .versions import bump_version
 
 # Environment-aware DB config
 IS_DOCKER = os.getenv("IS_DOCKER", "false").lower() == "true"
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "cleanup_db")
-POSTGRES_HOST = "db" if IS_DOCKER else "localhost"
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "db" if IS_DOCKER else "localhost")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+# psycopg2 is named explicitly: bulk loads use its COPY support
+DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+# Pool tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# 0 disables; bulk uploads can legitimately run long statements
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
 
 # 🔍 Print database connection string (without password for security)
 print("🔍 Using DB URL:", f"postgresql://{POSTGRES_USER}:****@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}")
 
-# Retry logic
-max_retries = 10
-for i in range(max_retries):
+_engine = None
+_engine_lock = threading.Lock()
+_session_factory = sessionmaker()
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def get_engine():
+    """Create the engine on first use; nothing connects at import time."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT}
+                if DB_STATEMENT_TIMEOUT_MS:
+                    connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+                _engine = create_engine(
+                    DATABASE_URL,
+                    future=True,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                    connect_args=connect_args,
+                )
+                _session_factory.configure(bind=_engine)
+    return _engine
+
+
+def SessionLocal():
+    get_engine()
+    return _session_factory()
+
+
+def __getattr__(name):
+    # Keeps ``from backend_app.database import engine`` working without
+    # creating the engine at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
+
+
+TRIGRAM_INDEXES = {
+    "ix_master_emails_email_trgm": ("master_emails", "email"),
+    "ix_master_email_segments_segment_trgm": ("master_email_segments", "segment"),
+    "ix_invalid_emails_email_trgm": ("invalid_emails", "email"),
+}
+
+def create_search_indexes(conn):
+    """Trigram GIN indexes behind the substring filters (needs pg_trgm)."""
     try:
-        engine = create_engine(DATABASE_URL, future=True)
-        with engine.connect():
-            pass  # Actually test the connection
-        SessionLocal = sessionmaker(bind=engine)
-        print("✅ Database connected.")
-        break
-    except OperationalError:
-        print(f"⏳ Database not ready, retrying in 3s... ({i+1}/{max_retries})")
-        time.sleep(3)
-else:
-    raise Exception("❌ Database connection failed after multiple retries.")
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        print(f"⚠️ pg_trgm unavailable, substring search will scan: {str(e.orig).splitlines()[0]}")
+        return
+    for index_name, (table, column) in TRIGRAM_INDEXES.items():
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING gin ({column} gin_trgm_ops)"
+        ))
+
+# Every advisory lock key the app takes, kept here so none is reused.
+# Serializes schema setup across server workers
+SCHEMA_LOCK_ID = 724301
+# Serializes brand bit allocation (brands.register_brand)
+BRANDS_LOCK_ID = 724302
+# Upload job slots and per-job run locks (jobs.py); two-int keys whose
+# first half is this id
+JOB_SLOT_LOCK_ID = 724304
+JOB_RUN_LOCK_ID = 724305
+
+
+def run_once(conn, name, migrate):
+    """Run ``migrate(conn)`` unless data_versions already records ``name``.
+
+    For data fixes that must not repeat on every worker start. The marker
+    is written in the same transaction as the migration.
+    """
+    done = conn.execute(text("SELECT 1 FROM data_versions WHERE name = :name"), {"name": name}).first()
+    if not done:
+        migrate(conn)
+        bump_version(conn, name)
+
+
+def _fill_last_updated(conn):
+    # Keyset pagination key for /master-emails; rows without a timestamp would
+    # drop out of it. Every writer sets it, so only pre-existing rows need it.
+    conn.execute(text("UPDATE master_emails SET last_updated = '1970-01-01' WHERE last_updated IS NULL"))
+
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    with get_engine().begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": SCHEMA_LOCK_ID})
+        Base.metadata.create_all(bind=conn)
+        # Columns added after the first release; create_all does not alter existing tables
+        conn.execute(text("ALTER TABLE invalid_emails ADD COLUMN IF NOT EXISTS added_at TIMESTAMP DEFAULT NOW()"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invalid_emails_added_at ON invalid_emails (added_at)"))
+        conn.execute(text("ALTER TABLE master_emails ADD COLUMN IF NOT EXISTS brand_mask BIGINT NOT NULL DEFAULT 0"))
+        conn.execute(text("ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS mode VARCHAR NOT NULL DEFAULT 'stream'"))
+        # Imported here: brands.py, stats.py and backfill.py sit above this module
+        from .backfill import backfill_canonical_emails, canonical_backfill_name
+        from .brands import init_brands
+        from .stats import init_stats
+        init_brands(conn)
+        # Rows stored before uploads canonicalized emails, or under other rules
+        run_once(conn, canonical_backfill_name(), backfill_canonical_emails)
+        # Exact brand combinations, e.g. counts per brand_mask
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_master_emails_brand_mask ON master_emails (brand_mask)"))
+        run_once(conn, "migration:master_last_updated", _fill_last_updated)
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_master_emails_last_updated_email "
+            "ON master_emails (last_updated DESC, email DESC)"
+        ))
+        create_search_indexes(conn)
+        init_stats(conn)
+
+
+def ensure_schema():
+    """Run init_db once per process; returns False while the DB is unreachable."""
+    global _schema_ready
+    if _schema_ready:
+        return True
+    with _schema_lock:
+        if not _schema_ready:
+            try:
+                init_db()
+            except DBAPIError as e:
+                print(f"⏳ Database not ready: {str(e.orig).splitlines()[0] if e.orig else e}")
+                return False
+            _schema_ready = True
+            print("✅ Database schema ready.")
+    return True
+
+
+def check_database():
+    """Readiness probe: schema initialized and a round trip succeeds."""
+    if not ensure_schema():
+        return False
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except DBAPIError:
+        return False
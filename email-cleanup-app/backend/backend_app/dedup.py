@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# Which row is kept when an email repeats in one upload:
+#   last           the row furthest down the file (what a plain upsert does)
+#   first          the row nearest the top
+#   most_complete  the row with the most of card_no/name/phone/segment filled
+#                  in; ties go to the later row
+DUPLICATE_POLICIES = ("last", "first", "most_complete")
+COMPLETENESS_COLUMNS = ["card_no", "name", "phone", "segment"]
+
+
+def _email_hashes(emails):
+    return pd.util.hash_pandas_object(emails, index=False).to_numpy()
+
+
+def _completeness(df):
+    columns = [col for col in COMPLETENESS_COLUMNS if col in df.columns]
+    filled = df[columns].notna() & df[columns].astype("string").ne("")
+    return filled.sum(axis=1).to_numpy(dtype=np.int8)
+
+
+class Deduplicator:
+    """Collapse repeated emails in an upload before anything is written.
+
+    ``apply`` is called once per chunk, in file order. Within a chunk the
+    duplicates are dropped by hashing; across chunks a sorted array of
+    64-bit email hashes (with the best completeness seen so far) decides
+    whether a later row may still replace an earlier one, so memory is 9
+    bytes per distinct email rather than the emails themselves.
+
+    With the "last" policy a later chunk's row always wins, which the
+    brand upsert already does, so nothing is dropped across chunks; the
+    repeat is only counted.
+    """
+
+    def __init__(self, policy="last"):
+        if policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicate_policy must be one of {list(DUPLICATE_POLICIES)}.")
+        self.policy = policy
+        self.collapsed = 0
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._scores = np.empty(0, dtype=np.int8)
+
+    def apply(self, df):
+        """``df`` without repeated emails, in file order; rows without an email are kept."""
+        has_email = df["email"].notna().to_numpy()
+        keyed = df[has_email]
+        if keyed.empty:
+            return df
+
+        hashes = _email_hashes(keyed["email"])
+        scores = _completeness(keyed)
+        order = pd.DataFrame({"hash": hashes, "score": scores, "position": np.arange(len(keyed))})
+        if self.policy == "most_complete":
+            order = order.sort_values(["hash", "score", "position"], kind="stable")
+            winners = order.drop_duplicates("hash", keep="last")
+        else:
+            winners = order.drop_duplicates("hash", keep="first" if self.policy == "first" else "last")
+        winners = winners.sort_values("position")
+        self.collapsed += len(keyed) - len(winners)
+
+        hashes = winners["hash"].to_numpy(dtype=np.uint64)
+        scores = winners["score"].to_numpy(dtype=np.int8)
+        slots = np.searchsorted(self._hashes, hashes)
+        seen = slots < len(self._hashes)
+        seen[seen] = self._hashes[slots[seen]] == hashes[seen]
+        self.collapsed += int(seen.sum())
+
+        keep = np.ones(len(winners), dtype=bool)
+        if self.policy == "first":
+            keep = ~seen
+        elif self.policy == "most_complete":
+            keep[seen] = scores[seen] >= self._scores[slots[seen]]
+            self._scores[slots[seen]] = np.maximum(self._scores[slots[seen]], scores[seen])
+        self._remember(hashes[~seen], scores[~seen])
+
+        kept_positions = winners["position"].to_numpy()[keep]
+        kept = np.zeros(len(df), dtype=bool)
+        kept[np.flatnonzero(has_email)[kept_positions]] = True
+        return df[kept | ~has_email]
+
+    def _remember(self, hashes, scores):
+        if not len(hashes):
+            return
+        merged = np.concatenate([self._hashes, hashes])
+        # The existing part is already sorted, so a stable sort is close to a merge
+        order = np.argsort(merged, kind="stable")
+        self._hashes = merged[order]
+        self._scores = np.concatenate([self._scores, scores])[order]
+
+
+def dedupe_frame(df, policy="last"):
+    """One-shot ``Deduplicator``: returns ``(deduplicated df, rows collapsed)``."""
+    deduplicator = Deduplicator(policy)
+    return deduplicator.apply(df), deduplicator.collapsed
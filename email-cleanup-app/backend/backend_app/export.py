@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import os
+
+from backend_app.database import SessionLocal
+from backend_app.brands import brand_fields
+from backend_app.models import MasterEmail
+from backend_app.search import SEGMENTS, filter_master
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "10000"))
+
+MASTER_COLUMNS = ["email", "card_no", "name", "phone"]
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_columns(brands):
+    """Output columns: master fields, then segment_<code> and is_<code> per brand."""
+    return MASTER_COLUMNS + list(brand_fields(brands, 0, {})) + ["last_updated"]
+
+
+def iter_master_batches(brands, search=None, brand=None, segment=None, include=None, exclude=None,
+                        batch_rows=EXPORT_BATCH_ROWS):
+    """Yield filtered master_emails rows, laid out as ``export_columns(brands)``, in lists of ``batch_rows``.
+
+    Uses a server-side cursor, so only one batch is held at a time. The
+    generator owns its session: a StreamingResponse outlives the request's
+    dependencies.
+    """
+    db = SessionLocal()
+    try:
+        columns = [getattr(MasterEmail, name) for name in MASTER_COLUMNS]
+        query = filter_master(
+            db.query(*columns, MasterEmail.brand_mask, SEGMENTS, MasterEmail.last_updated),
+            search=search, brand=brand, segment=segment, include=include, exclude=exclude
+        )
+        query = query.order_by(MasterEmail.last_updated.desc(), MasterEmail.email.desc())
+        result = db.execute(query.statement.execution_options(yield_per=batch_rows))
+        for partition in result.partitions():
+            yield [
+                (*row[:4], *brand_fields(brands, row.brand_mask, row.segments).values(), row.last_updated)
+                for row in partition
+            ]
+    finally:
+        db.close()
+
+
+def stream_csv(columns, batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def stream_ndjson(columns, batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=str) + "\n"
+            for row in batch
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_schema(columns):
+    import pyarrow as pa
+
+    def column_type(name):
+        if name == "last_updated":
+            return pa.timestamp("us")
+        return pa.bool_() if name.startswith("is_") else pa.string()
+
+    return pa.schema([(name, column_type(name)) for name in columns])
+
+
+def stream_parquet(columns, batches):
+    """One Parquet row group per batch, flushed as soon as it is written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet,
+}
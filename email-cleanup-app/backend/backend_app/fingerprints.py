@@ -0,0 +1,64 @@
+import hashlib
+import json
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+from backend_app.models import UploadFingerprint
+from backend_app.suppression import SUPPRESSION_VERSION
+from backend_app.versions import bump_version, get_version
+
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def file_sha256(fileobj):
+    """SHA-256 of a whole upload; leaves the file rewound for parsing."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(HASH_BLOCK_BYTES), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def rules_digest(rules):
+    return hashlib.sha256(json.dumps(rules, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def brand_version_name(code):
+    """data_versions entry bumped by every write to a brand's table."""
+    return f"brand:{code}"
+
+
+def touch_brand(db: Session, code):
+    """Record a write to a brand table; returns the new version. Does not commit."""
+    return bump_version(db, brand_version_name(code))
+
+
+def find_cached(db: Session, sha256, code, mode, rules):
+    """Stored result of an identical upload, if replaying it would change nothing.
+
+    That holds when the brand table has not been written since that upload
+    and the suppression list and validation rules are the same as then.
+    """
+    fingerprint = db.get(UploadFingerprint, (sha256, code, mode))
+    if fingerprint is None:
+        return None
+    if (
+        fingerprint.brand_version != get_version(db, brand_version_name(code))
+        or fingerprint.suppression_version != get_version(db, SUPPRESSION_VERSION)
+        or fingerprint.rules_digest != rules_digest(rules)
+    ):
+        return None
+    fingerprint.hits += 1
+    fingerprint.last_hit_at = datetime.utcnow()
+    db.commit()
+    return fingerprint.result
+
+
+def remember(db: Session, sha256, code, mode, rules, brand_version, suppression_version, result):
+    """Store (or replace) the result of a completed upload. Does not commit."""
+    db.merge(UploadFingerprint(
+        sha256=sha256, brand=code, mode=mode, rules_digest=rules_digest(rules),
+        brand_version=brand_version, suppression_version=suppression_version,
+        result=result, hits=0, created_at=datetime.utcnow(), last_hit_at=None,
+    ))
@@ -0,0 +1,89 @@
+import csv
+import os
+import pandas as pd
+
+# Intermediates handed between the files-mode stages. Parquet is compact;
+# Feather is read back memory-mapped without decoding. CSV is kept for
+# installs without pyarrow.
+try:
+    import pyarrow  # noqa: F401
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+INTERMEDIATE_FORMATS = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+INTERMEDIATE_FORMAT = os.getenv("INTERMEDIATE_FORMAT", "parquet" if HAVE_PYARROW else "csv")
+if INTERMEDIATE_FORMAT not in INTERMEDIATE_FORMATS or (INTERMEDIATE_FORMAT != "csv" and not HAVE_PYARROW):
+    print(f"⚠️ Intermediate format {INTERMEDIATE_FORMAT!r} unavailable, using csv")
+    INTERMEDIATE_FORMAT = "csv"
+
+READABLE_EXTENSIONS = (".parquet", ".feather", ".arrow", ".csv")
+
+
+def _to_pandas(table):
+    # Every column is text: card numbers and phones keep their leading zeros
+    import pyarrow as pa
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype(), pa.large_string(): pd.StringDtype()}.get)
+
+
+def read_csv_fast(path):
+    """Parse an uploaded CSV with every column as a string.
+
+    Uses pyarrow's multithreaded reader when available. Empty cells come
+    back as missing values, as with ``pd.read_csv``.
+    """
+    if not HAVE_PYARROW:
+        return pd.read_csv(path, encoding="utf-8-sig", dtype="string")
+
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        raise ValueError("No columns to parse from file")
+
+    table = pv.read_csv(
+        path,
+        read_options=pv.ReadOptions(use_threads=True, skip_rows=1, column_names=header),
+        convert_options=pv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=True,
+        ),
+    )
+    return _to_pandas(table)
+
+
+def read_frame(path):
+    """Load an intermediate (Parquet, Feather/Arrow IPC) or a CSV by extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+        return _to_pandas(pq.read_table(path, memory_map=True))
+    if extension in (".feather", ".arrow"):
+        import pyarrow.feather as feather
+        return _to_pandas(feather.read_table(path, memory_map=True))
+    return read_csv_fast(path)
+
+
+def write_frame(df, folder, stem, fmt=None):
+    """Write ``df`` as ``<stem>.<format>`` in ``folder`` and return the filename."""
+    fmt = fmt or INTERMEDIATE_FORMAT
+    filename = stem + INTERMEDIATE_FORMATS[fmt]
+    path = os.path.join(folder, filename)
+    frame = df.astype("string")
+    if fmt == "parquet":
+        frame.to_parquet(path, index=False)
+    elif fmt == "feather":
+        # Uncompressed, so reads can memory-map the columns directly
+        frame.reset_index(drop=True).to_feather(path, compression="uncompressed")
+    else:
+        frame.to_csv(path, index=False)
+    return filename
+
+
+def intermediate_stem(filename):
+    """``cleaned_x.csv`` -> ``cleaned_x``; names without a known extension are kept."""
+    stem, extension = os.path.splitext(filename)
+    return stem if extension.lower() in READABLE_EXTENSIONS else filename
@@ -0,0 +1,211 @@
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import bindparam, text
+
+from backend_app.database import JOB_RUN_LOCK_ID, JOB_SLOT_LOCK_ID, SessionLocal, get_engine
+from backend_app.models import UploadJob
+from backend_app.pipeline import PipelineError, run_upload
+
+# Uploads processed at once across every server process; further jobs wait
+# in the queue. Enforced with advisory locks, one per slot.
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+JOB_FOLDER = os.path.join("temp_uploads", "jobs")
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix="upload-job")
+
+
+def job_to_dict(job: UploadJob):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "brand": job.brand,
+        "filename": job.filename,
+        "mode": job.mode,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def _spool_path(job_id):
+    return os.path.join(JOB_FOLDER, f"{job_id}.csv")
+
+
+def submit_upload_job(fileobj, filename, brand, mode="stream"):
+    """Spool the upload to disk, record a queued job and wake the job pool."""
+    job_id = uuid.uuid4().hex
+    os.makedirs(JOB_FOLDER, exist_ok=True)
+    path = _spool_path(job_id)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(fileobj, f)
+
+    db = SessionLocal()
+    try:
+        job = UploadJob(
+            id=job_id, brand=brand, filename=filename, mode=mode, status="queued",
+            progress={"bytes_total": os.path.getsize(path), "bytes_read": 0, "percent": 0.0}
+        )
+        db.add(job)
+        db.commit()
+        response = job_to_dict(job)
+    finally:
+        db.close()
+
+    _executor.submit(_drain_queue)
+    return response
+
+
+def _take_slot(conn):
+    for slot in range(UPLOAD_JOB_WORKERS):
+        if conn.execute(text("SELECT pg_try_advisory_lock(:key, :slot)"), {"key": JOB_SLOT_LOCK_ID, "slot": slot}).scalar():
+            conn.commit()
+            return slot
+    conn.commit()
+    return None
+
+
+def _claim_job(conn):
+    """Mark the oldest queued job running and lock it for this connection."""
+    job = conn.execute(text("""
+        UPDATE upload_jobs SET status = 'running', started_at = NOW()
+        WHERE id = (
+            SELECT id FROM upload_jobs WHERE status = 'queued'
+            ORDER BY created_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, brand, mode
+    """)).first()
+    if job is not None:
+        # Taken before the claim commits: a running job without its lock
+        # has lost its process (see recover_upload_jobs)
+        conn.execute(text("SELECT pg_advisory_lock(:key, hashtext(:id))"), {"key": JOB_RUN_LOCK_ID, "id": job.id})
+    conn.commit()
+    return job
+
+
+def _run_next_job():
+    # A slot lock caps running jobs, the run lock marks the job alive. Both
+    # are session level: this connection stays checked out for
+    # the whole job, and a crashed process releases them by disconnecting
+    with get_engine().connect() as conn:
+        if _take_slot(conn) is None:
+            return False
+        try:
+            job = _claim_job(conn)
+            if job is None:
+                return False
+            _run_upload_job(job.id, _spool_path(job.id), job.brand, job.mode)
+            return True
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock_all()"))
+            conn.commit()
+
+
+def _drain_queue():
+    """Run queued jobs, from any process, until none is left or every slot is busy.
+
+    Whoever holds a slot claims again after each job, so a job queued while
+    all slots were taken is picked up as soon as one frees.
+    """
+    try:
+        while _run_next_job():
+            pass
+    except Exception as e:
+        # Executor threads drop exceptions; the jobs stay queued for the next drain
+        print(f"⚠️ Upload job queue stalled: {e}")
+
+
+def recover_upload_jobs():
+    """Fail jobs whose process died and pick up the queue left behind.
+
+    Run at startup. A running job whose run lock nobody holds, or a queued
+    job whose spool file is gone, is marked failed and its spool file
+    removed; jobs still queued with their file are resumed here.
+    """
+    db = SessionLocal()
+    try:
+        stale = db.execute(text("""
+            UPDATE upload_jobs SET status = 'failed', finished_at = NOW(),
+                error = 'Upload interrupted: the server restarted while it was running.'
+            WHERE status = 'running' AND pg_try_advisory_xact_lock(:key, hashtext(id))
+            RETURNING id
+        """), {"key": JOB_RUN_LOCK_ID}).scalars().all()
+        queued = db.execute(text("SELECT id FROM upload_jobs WHERE status = 'queued'")).scalars().all()
+        lost = [job_id for job_id in queued if not os.path.exists(_spool_path(job_id))]
+        if lost:
+            db.execute(text("""
+                UPDATE upload_jobs SET status = 'failed', finished_at = NOW(),
+                    error = 'Upload lost: its spooled file is no longer on disk.'
+                WHERE id IN :ids AND status = 'queued'
+            """).bindparams(bindparam("ids", expanding=True)), {"ids": lost})
+        db.commit()
+    finally:
+        db.close()
+
+    for job_id in stale:
+        if os.path.exists(_spool_path(job_id)):
+            os.remove(_spool_path(job_id))
+    if stale or lost:
+        print(f"🧹 Upload jobs recovered: {len(stale)} interrupted, {len(lost)} lost")
+    _executor.submit(_drain_queue)
+
+
+def _update_job(job_id, **fields):
+    db = SessionLocal()
+    try:
+        db.query(UploadJob).filter_by(id=job_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run_upload_job(job_id, path, brand, mode):
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        bytes_total = os.path.getsize(path)
+        with open(path, "rb") as f:
+            def report(totals):
+                # Parallel parsing reads the file in worker processes; f.tell() stays put
+                bytes_read = min(totals.pop("bytes_read", f.tell()), bytes_total)
+                _update_job(job_id, progress={
+                    **totals,
+                    "bytes_total": bytes_total,
+                    "bytes_read": bytes_read,
+                    "percent": round(100.0 * bytes_read / bytes_total, 1) if bytes_total else 100.0,
+                    "elapsed_seconds": round(time.perf_counter() - started, 2),
+                })
+
+            result = run_upload(db, f, brand, progress=report, mode=mode)
+
+        _update_job(
+            job_id, status="succeeded", result=result, finished_at=datetime.utcnow(),
+            progress={
+                "rows_uploaded": result["rows_uploaded"],
+                "chunks": result["chunks"],
+                "timings": result["timings"],
+                "bytes_total": bytes_total,
+                "bytes_read": bytes_total,
+                "percent": 100.0,
+                "elapsed_seconds": round(time.perf_counter() - started, 2),
+            }
+        )
+    except PipelineError as e:
+        db.rollback()
+        _update_job(job_id, status="failed", error=e.content["error"], result=e.content, finished_at=datetime.utcnow())
+    except Exception as e:
+        db.rollback()
+        _update_job(job_id, status="failed", error=f"Upload failed: {str(e)}", finished_at=datetime.utcnow())
+    finally:
+        db.close()
+        if os.path.exists(path):
+            os.remove(path)
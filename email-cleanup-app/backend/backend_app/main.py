@@ -1,28 +1,67 @@
-from fastapi import FastAPI, UploadFile, File, Form, Depends, Query
+from fastapi import FastAPI, UploadFile, File, Form, Depends, Query, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List
+from contextlib import asynccontextmanager
 import pandas as pd
 import os
-import io
+import time
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import select, text
-from sqlalchemy import or_, and_
-
-from backend_app import models
-from backend_app.database import engine, SessionLocal, init_db
-from backend_app.models import InvalidEmail, MasterEmail, EmailTR, EmailMFM, EmailNYSS
+from sqlalchemy import text, tuple_
+from sqlalchemy.exc import DBAPIError
+
+from backend_app.database import SessionLocal, check_database, ensure_schema
+from backend_app.models import InvalidEmail, MasterEmail, UploadJob
+from backend_app.batch import run_batch
+from backend_app.bulk import bulk_insert_invalid, bulk_upsert_brand, bulk_upsert_master
+from backend_app.merge import MASTER_VERSION, SCOPE_TABLE, create_scope, merge_master
+from backend_app.brands import (
+    BRANDS_VERSION, brand_code, brand_fields, brand_registry, brand_table, build_brand_index, parse_brand_codes,
+    register_brand
+)
+from backend_app.cleaning import normalize_emails, normalize_and_map_columns, to_records, transform_frame
+from backend_app.dedup import dedupe_frame
+from backend_app.frames import intermediate_stem, read_csv_fast, read_frame, write_frame
+from backend_app.pipeline import UPLOAD_MODES, PipelineError, run_upload
+from backend_app.fingerprints import file_sha256, touch_brand
+from backend_app.metrics import REQUEST_LATENCY, StageTimer, render_metrics
+from backend_app.profiling import ProfiledRoute, profile_request, wants_profile
+from backend_app.jobs import job_to_dict, recover_upload_jobs, submit_upload_job
+from backend_app.suppression import SUPPRESSION_VERSION, suppression_cache
+from backend_app.validation import canonicalize_emails, rules_for, suppressed_for, validate_series
+from backend_app.versions import bump_version
+from backend_app.search import SEGMENTS, filter_invalid, filter_master
+from backend_app.stats import add_suppressed, adjust_audience, lock_stats, read_stats, rebuild_stats
+from backend_app.export import EXPORT_FORMATS, STREAMERS, export_columns, iter_master_batches
+from backend_app.pagination import TOTAL_MODES, CursorError, count_rows, cursor_datetime, decode_cursor, encode_cursor
+from backend_app.response_cache import serve_cached
 
-# Initialize DB
-models.Base.metadata.create_all(bind=engine)
-init_db()
 
 UPLOAD_FOLDER = "temp_uploads"
+INVALID_CHUNK_ROWS = int(os.getenv("INVALID_CHUNK_ROWS", "200000"))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-app = FastAPI()
+# How /transform-cleaned-data writes master: one COPY + set-based upsert,
+# the original statement-per-row loop, or not at all
+MASTER_WRITE_MODES = ("bulk", "row", "skip")
+FILES_STAGES = ["spool", "read_csv", "map_columns", "validate", "dedup", "transform", "brand_upsert", "master_merge"]
+
+@asynccontextmanager
+async def lifespan(app):
+    # Schema setup is attempted once at startup but never blocks it: if the
+    # database is still coming up, the first request (or /ready) retries.
+    if await run_in_threadpool(ensure_schema):
+        # Jobs left running or queued by a previous server process
+        await run_in_threadpool(recover_upload_jobs)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+# Lets a request opt in to profiling (PROFILING_ENABLED=1 plus an X-Profile header)
+app.router.route_class = ProfiledRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,33 +71,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    profile = {} if wants_profile(request) else None
+    token = profile_request.set(profile)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        profile_request.reset(token)
+    # Streaming responses are timed up to their first byte
+    route = request.scope.get("route")
+    REQUEST_LATENCY.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    if profile and profile.get("report"):
+        response.headers["X-Profile-Report"] = profile["report"]
+    return response
+
 def get_db():
+    if not ensure_schema():
+        raise HTTPException(status_code=503, detail="Database not ready.")
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
-def normalize_emails(series):
-    return series.astype(str).str.strip().str.lower()
-
-def normalize_and_map_columns(df):
-    df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
-    column_aliases = {
-        "card_no": ["card_no", "card_number", "cardnum", "cardno", "card_no_"],
-        "brand": ["brand", "restaurant", "outlet"],
-        "name": ["name", "full_name", "customer_name"],
-        "phone": ["phone", "mobile", "mobile_number", "contact"],
-        "email": ["email", "email_address", "e-mail"],
-        "segment": ["segment", "segment_group", "group"]
-    }
-    for standard, aliases in column_aliases.items():
-        for alias in aliases:
-            if alias in df.columns and alias != standard:
-                df.rename(columns={alias: standard}, inplace=True)
-                break
-    return df
-
 class EmailUploadRequest(BaseModel):
     emails: List[str]
     brand: str
@@ -67,191 +109,378 @@ class EmailUploadRequest(BaseModel):
 def read_root():
     return {"message": "Email Cleanup API is live!"}
 
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+def readiness():
+    if not check_database():
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ready"}
+
+# The upload handlers are plain ``def`` on purpose: FastAPI runs them in its
+# worker threadpool, so pandas parsing and blocking DB calls never stall
+# the event loop serving other requests.
 @app.post("/upload")
-async def upload_csv(file: UploadFile = File(...), brand: str = Form(...), db: Session = Depends(get_db)):
-    file_path = os.path.join(UPLOAD_FOLDER, f"{datetime.now().timestamp()}_{file.filename}")
-    contents = await file.read()
+def upload_csv(
+    file: UploadFile = File(...),
+    brand: str = Form(...),
+    mode: str = Form("stream"),
+    background: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    """Clean a brand CSV and load it into the brand table and master list.
+
+    ``mode`` is "stream" (upsert every row), "delta" (write only new or
+    changed rows and retire brand rows missing from the file) or "files"
+    (the legacy stage-by-stage path through temp files). Stream and delta
+    uploads are fingerprinted: re-sending identical bytes returns the
+    stored result while nothing has changed since.
+    """
+    if mode not in UPLOAD_MODES + ("files",):
+        return JSONResponse(status_code=400, content={"error": "Unknown mode. Use 'stream', 'delta' or 'files'."})
+
+    if background:
+        # Runs the pipeline in the job pool; poll /jobs/{job_id} for progress
+        if mode not in UPLOAD_MODES:
+            return JSONResponse(status_code=400, content={"error": "Background uploads support 'stream' and 'delta' modes."})
+        if not brand_code(db, brand):
+            return JSONResponse(status_code=400, content={"error": "Unknown brand."})
+        job = submit_upload_job(file.file, file.filename, brand, mode=mode)
+        return JSONResponse(status_code=202, content=jsonable_encoder({**job, "status_url": f"/jobs/{job['job_id']}"}))
+
+    if mode in UPLOAD_MODES:
+        try:
+            return run_upload(db, file.file, brand, mode=mode)
+        except PipelineError as e:
+            return JSONResponse(status_code=400, content=e.content)
+        except Exception as e:
+            return JSONResponse(status_code=400, content={"error": f"Upload failed: {str(e)}"})
+
+    timer = StageTimer("files", FILES_STAGES)
+    # Named by content, so a repeated export overwrites its own copy
+    file_path = os.path.join(UPLOAD_FOLDER, f"{file_sha256(file.file)[:16]}_{file.filename}")
+    contents = file.file.read()
     with open(file_path, "wb") as f:
         f.write(contents)
+    timer.lap("spool")
 
     try:
-        df = pd.read_csv(file_path, encoding='utf-8-sig')
+        df = read_csv_fast(file_path)
+        timer.lap("read_csv", rows=len(df))
         df = normalize_and_map_columns(df)
+        timer.lap("map_columns", rows=len(df))
 
         if 'email' not in df.columns:
             return JSONResponse(status_code=400, content={"error": "CSV missing 'email' column.", "detected_columns": df.columns.tolist()})
 
-        df['email'] = normalize_emails(df['email'])
-
-        invalid_emails_set = {email for (email,) in db.query(InvalidEmail.email).all() if email}
-        df['is_invalid'] = df['email'].apply(lambda e: e in invalid_emails_set)
-
-        cleaned_df = df[df['is_invalid'] == False].copy()
-        cleaned_path = os.path.join(UPLOAD_FOLDER, f"cleaned_{file.filename}")
-        cleaned_df.to_csv(cleaned_path, index=False)
-        sample = cleaned_df.head(10).to_dict(orient="records")
-
-        transform_result = transform_cleaned_data(filename=f"cleaned_{file.filename}", brand=brand, db=db)
+        rules = rules_for(brand)
+        df['email'], rejected_by, rejections = validate_series(
+            normalize_emails(df['email']), rules, suppressed_for(db, brand, rules)
+        )
+        df['is_invalid'] = rejected_by.notna()
+        timer.lap("validate", rows=len(df))
+
+        cleaned_df, collapsed = dedupe_frame(df[df['is_invalid'] == False].copy(), rules["duplicate_policy"])
+        cleaned_file = write_frame(
+            cleaned_df.drop(columns="is_invalid"), UPLOAD_FOLDER, f"cleaned_{intermediate_stem(file.filename)}"
+        )
+        sample = to_records(cleaned_df.head(10))
+        timer.lap("dedup", rows=len(cleaned_df) + collapsed)
+
+        # merge_master below recomputes these emails from the brand table, so
+        # writing master here as well would only be overwritten
+        transform_result = transform_cleaned_data(filename=cleaned_file, brand=brand, mode="skip", db=db)
         if isinstance(transform_result, JSONResponse):
             return transform_result
+        timer.lap("transform", rows=len(cleaned_df))
 
-        save_result = save_to_brand(filename=transform_result["transformed_file"], brand=brand, db=db)
+        save_result = save_to_brand(filename=transform_result["transformed_file"], brand=brand, mode="bulk", db=db)
         if isinstance(save_result, JSONResponse):
             return save_result
+        timer.lap("brand_upsert", rows=len(cleaned_df))
         
-        db.flush()
-        db.expire_all()
+        merge_result = {"status": "success", **merge_master(db, emails=cleaned_df["email"])}
+        db.commit()
+        timer.lap("master_merge", rows=len(cleaned_df))
+        timer.publish()
 
-        merge_result = merge_into_master(db=db)
-        if isinstance(merge_result, JSONResponse):
-            return merge_result
-        
         # Extract invalids
         invalid_df = df[df['is_invalid'] == True].copy()
-        invalid_emails = invalid_df['email'].tolist()
-        invalid_count = len(invalid_emails)
+        invalid_emails = invalid_df['email'].dropna().tolist()
+        invalid_count = len(invalid_df)
 
         return {
             "status": "success",
             "brand": brand,
+            "mode": mode,
             "rows_uploaded": len(df),
-            "rows_after_invalid_removal": len(cleaned_df),
+            "rows_after_invalid_removal": len(cleaned_df) + collapsed,
             "invalid_count": invalid_count,
+            "duplicates_collapsed": collapsed,
             "invalid_emails": invalid_emails[:50],  # Optional: show top 50 only
+            "rejections": rejections,
             "transformed_file": transform_result["transformed_file"],
             "preview": sample,
             "inserted_to_brand": save_result.get("inserted", 0),
-            "merge_result": merge_result
+            "updated_in_brand": save_result.get("updated", 0),
+            "merge_result": merge_result,
+            "timings": timer.report()
         }
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": f"Upload failed: {str(e)}"})
 
 
+@app.post("/upload/batch")
+def upload_batch(
+    files: List[UploadFile] = File(...),
+    brands: List[str] = Form(...),
+    mode: str = Form("stream"),
+    db: Session = Depends(get_db)
+):
+    """Load one file per brand concurrently, then merge master once.
+
+    ``brands`` lists the brand of each file, in the same order. Every file
+    gets its own outcome under ``files``; ``status`` is "partial" when
+    some files (or the final merge) failed, and the request fails with 400
+    only when no file was loaded.
+    """
+    if mode not in UPLOAD_MODES:
+        return JSONResponse(status_code=400, content={"error": f"Unknown mode. Use one of {list(UPLOAD_MODES)}."})
+    if len(files) != len(brands):
+        return JSONResponse(status_code=400, content={"error": "Send one brand per file, in the same order."})
+    codes = [brand_code(db, brand) for brand in brands]
+    unknown = [brand for brand, code in zip(brands, codes) if not code]
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": f"Unknown brand: {', '.join(unknown)}."})
+    if len(set(codes)) != len(codes):
+        return JSONResponse(status_code=400, content={"error": "Each brand can appear only once per batch."})
+
+    result = run_batch(db, [(file.file, file.filename, brand) for file, brand in zip(files, brands)], mode=mode)
+    if result["status"] == "failed":
+        return JSONResponse(status_code=400, content=jsonable_encoder({"error": "No file in the batch was loaded.", **result}))
+    return result
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(UploadJob).filter_by(id=job_id).first()
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "Job not found."})
+    return job_to_dict(job)
+
+
+@app.get("/jobs")
+def list_jobs(
+    limit: int = Query(20, ge=1, le=200),
+    status: str = Query(None),
+    db: Session = Depends(get_db)
+):
+    query = db.query(UploadJob)
+    if status:
+        query = query.filter(UploadJob.status == status)
+    jobs = query.order_by(UploadJob.created_at.desc()).limit(limit).all()
+    return {"status": "success", "data": [job_to_dict(job) for job in jobs]}
+
+
 @app.post("/invalid-emails/upload")
-async def upload_invalid_emails(
+def upload_invalid_emails(
     file: UploadFile = File(...),
     brand: str = Form(...),
     db: Session = Depends(get_db)
 ):
-    try:
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode("utf-8-sig")))
+    rules = rules_for(brand)
 
-        if 'email' not in df.columns:
-            return JSONResponse(status_code=400, content={
-                "error": "Missing 'email' column.",
-                "detected_columns": df.columns.tolist()
-            })
-
-        df['email'] = df['email'].astype(str).str.strip().str.lower()
-        added = 0
-
-        for email in df['email'].unique():
-            if not db.query(InvalidEmail).filter_by(email=email).first():
-                db.add(InvalidEmail(email=email, brand=brand))
-                added += 1
+    def email_chunks():
+        # UploadFile spools large bodies to disk; read it back in chunks
+        reader = pd.read_csv(file.file, encoding="utf-8-sig", dtype=str, chunksize=INVALID_CHUNK_ROWS)
+        for chunk in reader:
+            if 'email' not in chunk.columns:
+                raise PipelineError("Missing 'email' column.", detected_columns=chunk.columns.tolist())
+            yield canonicalize_emails(normalize_emails(chunk['email']), rules)
 
+    try:
+        result = bulk_insert_invalid(db, email_chunks(), brand)
+        if result["added"]:
+            bump_version(db, SUPPRESSION_VERSION)
+            add_suppressed(db, brand, result["added"])
         db.commit()
-        return {"status": "success", "brand": brand, "added": added}
+        return {"status": "success", "brand": brand, **result}
 
+    except PipelineError as e:
+        return JSONResponse(status_code=400, content=e.content)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
-    
+
+@app.get("/invalid-emails/cache-stats")
+def get_invalid_emails_cache_stats():
+    return {"status": "success", "cache": suppression_cache.snapshot()}
+
 @app.get("/invalid-emails")
 def get_invalid_emails(
+    request: Request,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     search: str = Query(None),
     brand: str = Query(None),
+    cursor: str = Query(None),
+    total: str = Query(None),
     db: Session = Depends(get_db)
 ):
+    """List suppressed emails ordered by email.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` for keyset
+    pagination (``offset`` is then ignored). ``total`` selects how the
+    total is computed: exact, estimate or none. It defaults to exact for
+    offset pages and none for cursor pages.
+
+    Responses carry an ETag tied to the suppression list's version; send it
+    back as If-None-Match to get a 304 until the list changes.
+    """
+    return serve_cached(request, db, "invalid_emails", [SUPPRESSION_VERSION], lambda: list_invalid_emails(
+        db, limit, offset, search, brand, cursor, total
+    ))
+
+
+def list_invalid_emails(db, limit, offset, search, brand, cursor, total):
     try:
-        query = db.query(InvalidEmail)
+        total_mode = total or ("none" if cursor else "exact")
+        if total_mode not in TOTAL_MODES:
+            return JSONResponse(status_code=400, content={"error": f"total must be one of {list(TOTAL_MODES)}."})
 
-        if search:
-            query = query.filter(InvalidEmail.email.ilike(f"%{search}%"))
-        if brand:
-            query = query.filter(InvalidEmail.brand == brand)
+        query = filter_invalid(db.query(InvalidEmail), search=search, brand=brand)
+
+        total_count = count_rows(db, query, total_mode)
+
+        query = query.order_by(InvalidEmail.email)
+        if cursor:
+            (last_email,) = decode_cursor(cursor, 1)
+            query = query.filter(InvalidEmail.email > last_email)
+        else:
+            query = query.offset(offset)
+        emails = query.limit(limit).all()
 
-        total = query.count()
-        emails = query.offset(offset).limit(limit).all()
+        next_cursor = encode_cursor(emails[-1].email) if len(emails) == limit else None
 
         return {
             "status": "success",
-            "total": total,
+            "total": total_count,
+            "total_mode": total_mode,
+            "next_cursor": next_cursor,
             "data": [{"email": e.email, "brand": e.brand} for e in emails]
         }
+    except CursorError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 
 @app.post("/validate-emails")
-async def validate_emails(
+def validate_emails(
     file: UploadFile = File(...),
     brand: str = Form(...),
     db: Session = Depends(get_db)
 ):
     file_path = os.path.join(UPLOAD_FOLDER, f"validate_{datetime.now().timestamp()}_{file.filename}")
-    contents = await file.read()
+    contents = file.file.read()
     with open(file_path, "wb") as f:
         f.write(contents)
 
     try:
-        df = pd.read_csv(file_path, encoding='utf-8-sig')
-        df = normalize_and_map_columns(df)
+        df = normalize_and_map_columns(read_csv_fast(file_path))
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": f"Invalid CSV: {str(e)}"})
 
     if 'email' not in df.columns:
         return JSONResponse(status_code=400, content={"error": "Email column not found in CSV.", "detected_columns": df.columns.tolist()})
 
-    df["email"] = normalize_emails(df["email"])
-    invalid_set = {
-        record.email.strip().lower()
-        for record in db.query(InvalidEmail).all()
-        if record.email
-    }
+    rules = rules_for(brand)
+    df["email"], rejected_by, rejections = validate_series(
+        normalize_emails(df["email"]), rules, suppressed_for(db, brand, rules)
+    )
 
-    df["status"] = df["email"].apply(lambda e: "invalid" if e in invalid_set else "valid")
+    df["status"] = rejected_by.isna().map({True: "valid", False: "invalid"})
     valid_emails = df[df["status"] == "valid"]["email"].tolist()
-    invalid_emails = df[df["status"] == "invalid"]["email"].tolist()
+    invalid_emails = df[df["status"] == "invalid"]["email"].dropna().tolist()
 
     return {
         "total": len(df),
         "valid_count": len(valid_emails),
-        "invalid_count": len(invalid_emails),
+        "invalid_count": int((df["status"] == "invalid").sum()),
         "valid_emails": valid_emails[:50],
         "invalid_emails": invalid_emails[:50],
+        "rejections": rejections,
     }
 
 
 
+def upsert_master_rows(db, df, brand):
+    """Statement-per-row master write; kept as the baseline for bulk_upsert_master."""
+    for row in to_records(df):
+        email = row.get("email")
+        if pd.isna(email):
+            continue
+        params = {
+            "email": email,
+            "card_no": row.get("card_no"),
+            "name": row.get("name"),
+            "phone": row.get("phone"),
+            "mask": brand.mask,
+            "brand": brand.code,
+            "segment": row.get("segment")
+        }
+        db.execute(text("""
+            INSERT INTO master_emails (email, card_no, name, phone, brand_mask, last_updated)
+            VALUES (:email, :card_no, :name, :phone, :mask, NOW())
+            ON CONFLICT (email) DO UPDATE SET
+                brand_mask = master_emails.brand_mask | EXCLUDED.brand_mask,
+                last_updated = NOW(),
+                card_no = COALESCE(master_emails.card_no, EXCLUDED.card_no),
+                name = COALESCE(master_emails.name, EXCLUDED.name),
+                phone = COALESCE(master_emails.phone, EXCLUDED.phone);
+        """), params)
+        if params["segment"] is None:
+            db.execute(text(
+                "DELETE FROM master_email_segments WHERE email = :email AND brand = :brand"
+            ), params)
+        else:
+            db.execute(text("""
+                INSERT INTO master_email_segments (email, brand, segment)
+                VALUES (:email, :brand, :segment)
+                ON CONFLICT (email, brand) DO UPDATE SET segment = EXCLUDED.segment;
+            """), params)
+
+
 @app.post("/transform-cleaned-data")
 def transform_cleaned_data(
     filename: str = Form(...),
     brand: str = Form(...),
+    mode: str = Form("bulk"),
     db: Session = Depends(get_db)
 ):
+    """Prefix segments, stamp the brand and dedupe a cleaned file, then write it to master.
+
+    ``mode`` picks how master is written (see MASTER_WRITE_MODES); "skip"
+    only produces the transformed file, for callers that merge master
+    from the brand table afterwards.
+    """
     brand = brand.strip()
-    brand_short = {
-        "Tony Romas": "TR",
-        "The Manhattan Fish Market": "MFM",
-        "New York Steak Shack": "NYSS"
-    }
+    code = brand_code(db, brand)
 
-    if brand not in brand_short:
+    if not code:
         return JSONResponse(status_code=400, content={"error": "Unknown brand."})
+    if mode not in MASTER_WRITE_MODES:
+        return JSONResponse(status_code=400, content={"error": f"mode must be one of {list(MASTER_WRITE_MODES)}."})
 
-    brand_code = brand_short[brand]
     file_path = os.path.join(UPLOAD_FOLDER, filename)
 
     if not os.path.exists(file_path):
         return JSONResponse(status_code=404, content={"error": "File not found."})
 
     try:
-        df = pd.read_csv(file_path, encoding='utf-8-sig')
-        df = normalize_and_map_columns(df)
+        df = normalize_and_map_columns(read_frame(file_path))
 
         if "segment" not in df.columns or "brand" not in df.columns:
             return JSONResponse(status_code=400, content={
@@ -259,53 +488,39 @@ def transform_cleaned_data(
                 "detected_columns": df.columns.tolist()
             })
 
-        df["segment"] = brand_code + "_" + df["segment"].astype(str).str.strip()
-        df["brand"] = brand
-
-        transformed_filename = f"transformed_{filename}"
-        transformed_path = os.path.join(UPLOAD_FOLDER, transformed_filename)
-        df.to_csv(transformed_path, index=False)
+        df = transform_frame(df, brand, code)
+        rules = rules_for(brand)
+        df["email"] = canonicalize_emails(normalize_emails(df["email"]), rules)
+        # One master write per email, not one per repeat
+        df, collapsed = dedupe_frame(df, rules["duplicate_policy"])
 
-        segment_field = f"segment_{brand_code.lower()}"
-        is_flag = f"is_{brand_code.lower()}"
-
-        for _, row in df.iterrows():
-            email = row.get("email")
-            if pd.isna(email):
-                continue
-            stmt = text(f"""
-                INSERT INTO master_emails (
-                    email, card_no, name, phone,
-                    {segment_field}, {is_flag}, last_updated
-                )
-                VALUES (
-                    :email, :card_no, :name, :phone,
-                    :segment, TRUE, NOW()
-                )
-                ON CONFLICT (email) DO UPDATE SET
-                    {segment_field} = EXCLUDED.{segment_field},
-                    {is_flag} = TRUE,
-                    last_updated = NOW(),
-                    card_no = COALESCE(master_emails.card_no, EXCLUDED.card_no),
-                    name = COALESCE(master_emails.name, EXCLUDED.name),
-                    phone = COALESCE(master_emails.phone, EXCLUDED.phone);
-            """)
-            db.execute(stmt, {
-                "email": str(row.get("email")).strip().lower(),
-                "card_no": row.get("card_no"),
-                "name": row.get("name"),
-                "phone": row.get("phone"),
-                "segment": row.get("segment")
-            })
-
-        db.commit()
-        preview = df.head(10).to_dict(orient="records")
-        return {
+        transformed_filename = write_frame(df, UPLOAD_FOLDER, f"transformed_{intermediate_stem(filename)}")
+        response = {
             "status": "success",
             "brand": brand,
+            "mode": mode,
             "transformed_file": transformed_filename,
-            "preview": preview
+            "duplicates_collapsed": collapsed,
+            "preview": to_records(df.head(10))
         }
+        if mode == "skip":
+            return response
+
+        # Bracket the master writes so /stats counts what they changed
+        lock_stats(db)
+        create_scope(db, emails=df["email"])
+        adjust_audience(db, SCOPE_TABLE, -1)
+
+        if mode == "bulk":
+            response.update(bulk_upsert_master(db, df, brand_registry.by_code(db, code)))
+        else:
+            upsert_master_rows(db, df, brand_registry.by_code(db, code))
+
+        adjust_audience(db, SCOPE_TABLE, 1)
+        bump_version(db, MASTER_VERSION)
+        touch_brand(db, code)
+        db.commit()
+        return response
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Failed to transform: {str(e)}"})
@@ -316,34 +531,49 @@ def transform_cleaned_data(
 def save_to_brand(
     filename: str = Form(...),
     brand: str = Form(...),
+    mode: str = Form("bulk"),
     db: Session = Depends(get_db)
 ):
-    brand_map = {
-        "Tony Romas": "emails_tr",
-        "The Manhattan Fish Market": "emails_mfm",
-        "New York Steak Shack": "emails_nyss"
-    }
+    code = brand_code(db, brand)
 
-    if brand not in brand_map:
+    if not code:
         return JSONResponse(status_code=400, content={"error": "Unknown brand."})
 
-    table_name = brand_map[brand]
+    table_name = brand_table(code)
     file_path = os.path.join(UPLOAD_FOLDER, filename)
 
     if not os.path.exists(file_path):
         return JSONResponse(status_code=404, content={"error": "File not found."})
 
     try:
-        df = pd.read_csv(file_path, encoding='utf-8-sig')
-        df = normalize_and_map_columns(df)
+        df = normalize_and_map_columns(read_frame(file_path))
 
         required_cols = ["card_no", "brand", "name", "phone", "email", "segment"]
         missing_cols = [col for col in required_cols if col not in df.columns]
         if missing_cols:
             return JSONResponse(status_code=400, content={"error": f"Missing columns: {missing_cols}", "detected_columns": df.columns.tolist()})
 
+        if mode not in ("bulk", "row"):
+            return JSONResponse(status_code=400, content={"error": "Unknown mode. Use 'bulk' or 'row'."})
+
+        rules = rules_for(brand)
+        df["email"] = canonicalize_emails(normalize_emails(df["email"]), rules)
+        df, collapsed = dedupe_frame(df, rules["duplicate_policy"])
+
+        if mode == "bulk":
+            result = bulk_upsert_brand(db, df, table_name)
+            touch_brand(db, code)
+            db.commit()
+            return {
+                "status": "success",
+                "brand_table": table_name,
+                "mode": mode,
+                "duplicates_collapsed": collapsed,
+                **result
+            }
+
         insert_count = 0
-        for _, row in df.iterrows():
+        for row in to_records(df):
             stmt = text(f"""
                 INSERT INTO {table_name} (card_no, brand, name, phone, email, segment)
                 VALUES (:card_no, :brand, :name, :phone, :email, :segment)
@@ -359,16 +589,19 @@ def save_to_brand(
                 "brand": row["brand"],
                 "name": row["name"],
                 "phone": row["phone"],
-                "email": str(row["email"]).strip().lower(),
+                "email": row["email"],
                 "segment": row["segment"]
             })
+            insert_count += 1
 
-        insert_count += 1
+        touch_brand(db, code)
         db.commit()
 
         return {
             "status": "success",
             "brand_table": table_name,
+            "mode": mode,
+            "duplicates_collapsed": collapsed,
             "inserted": insert_count
         }
 
@@ -376,126 +609,210 @@ def save_to_brand(
         return JSONResponse(status_code=500, content={"error": f"Failed to save: {str(e)}"})
 
 
+@app.get("/stats")
+def get_stats(db: Session = Depends(get_db)):
+    """Audience counts per brand and segment, brand overlap and suppression totals.
+
+    Served from aggregates that merges, master writes and suppression
+    uploads keep up to date; ``freshness`` says when they last changed.
+    """
+    return {"status": "success", **read_stats(db, brand_registry.all(db))}
+
+
+@app.post("/stats/rebuild")
+def rebuild_audience_stats(db: Session = Depends(get_db)):
+    """Recount the /stats aggregates from the tables (after manual edits)."""
+    try:
+        rebuild_stats(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    return {"status": "success", **read_stats(db, brand_registry.all(db))}
+
+
+@app.get("/brands")
+def list_brands(db: Session = Depends(get_db)):
+    brands = brand_registry.all(db)
+    return {"status": "success", "data": [{**b._asdict(), "table": b.table} for b in brands]}
+
+
+@app.post("/brands")
+def add_brand(
+    code: str = Form(...),
+    name: str = Form(...),
+    db: Session = Depends(get_db)
+):
+    """Register a brand. Its table and index are created on the spot; no migration is needed."""
+    try:
+        brand = register_brand(db, code, name)
+        db.commit()
+    except ValueError as e:
+        db.rollback()
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        build_brand_index(brand)
+    except DBAPIError as e:
+        # The brand works without it; init_brands retries on the next start
+        print(f"⚠️ Index for brand {brand.code} not built: {str(e.orig).splitlines()[0] if e.orig else e}")
+    return JSONResponse(status_code=201, content={"status": "success", **brand._asdict(), "table": brand.table})
+
+
 @app.post("/merge-into-master")
-def merge_into_master(db: Session = Depends(get_db)):
+def merge_into_master(
+    brand: str = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Merge brand tables into master_emails.
+
+    Without ``brand`` every brand row is merged; with a registered brand
+    code (e.g. TR) only that brand's current and previously flagged
+    emails are recomputed.
+    """
     try:
-        now = datetime.utcnow()
-        inserted, updated, removed = 0, 0, 0
-
-        tr_data = db.execute(select(EmailTR)).scalars().all()
-        mfm_data = db.execute(select(EmailMFM)).scalars().all()
-        nyss_data = db.execute(select(EmailNYSS)).scalars().all()
-
-
-        # Rebuild master_emails from brand tables
-        email_map = {}
-
-        for record in tr_data + mfm_data + nyss_data:
-            email = record.email.strip().lower()
-            if email not in email_map:
-                email_map[email] = {
-                    "email": email,
-                    "card_no": record.card_no,
-                    "name": record.name,
-                    "phone": record.phone,
-                    "segment_tr": None,
-                    "segment_mfm": None,
-                    "segment_nyss": None,
-                    "is_tr": False,
-                    "is_mfm": False,
-                    "is_nyss": False,
-                    "last_updated": now
-                }
-
-            if isinstance(record, EmailTR):
-                email_map[email]["segment_tr"] = record.segment
-                email_map[email]["is_tr"] = True
-            elif isinstance(record, EmailMFM):
-                email_map[email]["segment_mfm"] = record.segment
-                email_map[email]["is_mfm"] = True
-            elif isinstance(record, EmailNYSS):
-                email_map[email]["segment_nyss"] = record.segment
-                email_map[email]["is_nyss"] = True
-
-        for email, data in email_map.items():
-            existing = db.query(MasterEmail).filter_by(email=email).first()
-            if existing:
-                for field, value in data.items():
-                    setattr(existing, field, value)
-                updated += 1
-            else:
-                db.add(MasterEmail(**data))
-                inserted += 1
+        code = None
+        if brand:
+            found = brand_registry.by_code(db, brand)
+            if found is None:
+                return JSONResponse(status_code=400, content={"error": "Unknown brand."})
+            code = found.code
 
+        result = merge_master(db, brand_code=code)
         db.commit()
-        return {
-            "status": "success",
-            "inserted": inserted,
-            "updated": updated,
-            "total": inserted + updated
-        }
+        return {"status": "success", **result}
 
     except Exception as e:
+        db.rollback()
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 
+@app.get("/master-emails/export")
+def export_master_emails(
+    format: str = Query("csv"),
+    search: str = Query(None),
+    brand: str = Query(None),
+    segment: str = Query(None),
+    include: str = Query(None),
+    exclude: str = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Stream the filtered master list as CSV, NDJSON or Parquet.
+
+    Rows are read through a server-side cursor and written out batch by
+    batch, so memory stays flat regardless of how many rows match.
+    """
+    try:
+        parse_brand_codes(db, ",".join(filter(None, [brand, include, exclude])))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"format must be one of {list(EXPORT_FORMATS)}."})
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return JSONResponse(status_code=400, content={"error": "Parquet export requires pyarrow."})
+
+    brands = brand_registry.all(db)
+    batches = iter_master_batches(
+        brands, search=search, brand=brand, segment=segment, include=include, exclude=exclude
+    )
+    filename = f"master_emails_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        STREAMERS[format](export_columns(brands), batches),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @app.get("/master-emails")
 def get_master_emails(
+    request: Request,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
     search: str = Query(None),
     brand: str = Query(None),
     segment: str = Query(None),
+    include: str = Query(None),
+    exclude: str = Query(None),
     full_export: bool = Query(False),
+    cursor: str = Query(None),
+    total: str = Query(None),
     db: Session = Depends(get_db)
 ):
+    """List master emails, newest first.
+
+    Rows are ordered by ``(last_updated, email)`` descending. Pass the
+    returned ``next_cursor`` back as ``cursor`` to page by key instead of
+    offset. ``total`` is exact, estimate or none; it defaults to exact for
+    offset pages and none for cursor pages. ``include``/``exclude`` take
+    comma-separated brand codes, e.g. ``include=TR,MFM&exclude=NYSS``.
+
+    Responses carry an ETag tied to the master list's and the brand
+    registry's versions; If-None-Match gets a 304 until either changes,
+    and repeated queries are answered from an in-process cache.
+    """
+    return serve_cached(request, db, "master_emails", [MASTER_VERSION, BRANDS_VERSION], lambda: list_master_emails(
+        db, limit, offset, search, brand, segment, include, exclude, full_export, cursor, total
+    ))
+
+
+def list_master_emails(db, limit, offset, search, brand, segment, include, exclude, full_export, cursor, total):
     try:
-        query = db.query(MasterEmail)
-
-        # Apply filters
-        if search:
-            query = query.filter(MasterEmail.email.ilike(f"%{search}%"))
-        if brand == "TR":
-            query = query.filter(MasterEmail.is_tr == True)
-        elif brand == "MFM":
-            query = query.filter(MasterEmail.is_mfm == True)
-        elif brand == "NYSS":
-            query = query.filter(MasterEmail.is_nyss == True)
-        if segment:
+        total_mode = total or ("none" if cursor else "exact")
+        if total_mode not in TOTAL_MODES:
+            return JSONResponse(status_code=400, content={"error": f"total must be one of {list(TOTAL_MODES)}."})
+
+        query = filter_master(
+            db.query(MasterEmail), search=search, brand=brand, segment=segment, include=include, exclude=exclude
+        )
+
+        total_count = count_rows(db, query, total_mode)
+        query = query.add_columns(SEGMENTS)
+
+        query = query.order_by(MasterEmail.last_updated.desc(), MasterEmail.email.desc())
+        if cursor:
+            last_updated, last_email = decode_cursor(cursor, 2)
             query = query.filter(
-                or_(
-                    MasterEmail.segment_tr.ilike(f"%{segment}%"),
-                    MasterEmail.segment_mfm.ilike(f"%{segment}%"),
-                    MasterEmail.segment_nyss.ilike(f"%{segment}%"),
-                )
+                tuple_(MasterEmail.last_updated, MasterEmail.email) < (cursor_datetime(last_updated), last_email)
             )
-
-        total = query.count()
+        elif not full_export:
+            query = query.offset(offset)
 
         # Only paginate if not full_export
         if not full_export:
-            query = query.offset(offset).limit(limit)
+            query = query.limit(limit)
+
+        results = query.all()
 
-        results = query.order_by(MasterEmail.last_updated.desc()).all()
+        next_cursor = None
+        if not full_export and len(results) == limit:
+            last = results[-1].MasterEmail
+            next_cursor = encode_cursor(last.last_updated, last.email)
 
+        brands = brand_registry.all(db)
         emails = [
             {
                 "email": row.email,
                 "card_no": row.card_no,
                 "name": row.name,
                 "phone": row.phone,
-                "segment_tr": row.segment_tr,
-                "segment_mfm": row.segment_mfm,
-                "segment_nyss": row.segment_nyss,
-                "is_tr": row.is_tr,
-                "is_mfm": row.is_mfm,
-                "is_nyss": row.is_nyss,
+                **brand_fields(brands, row.brand_mask, segments),
+                "brands": [b.code for b in brands if row.brand_mask & b.mask],
                 "last_updated": row.last_updated
             }
-            for row in results
+            for row, segments in results
         ]
 
-        return {"status": "success", "total": total, "data": emails}
+        return {
+            "status": "success",
+            "total": total_count,
+            "total_mode": total_mode,
+            "next_cursor": next_cursor,
+            "data": emails
+        }
+    except (CursorError, ValueError) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -0,0 +1,204 @@
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend_app.brands import brand_registry
+from backend_app.bulk import copy_dataframe
+from backend_app.stats import adjust_audience, lock_stats, rebuild_stats
+from backend_app.versions import bump_version
+
+SCOPE_TABLE = "merge_scope"
+# Bumped whenever master_emails or its segments change; /master-emails
+# ETags and cached pages key off it
+MASTER_VERSION = "master_emails"
+
+
+def open_scope(db: Session):
+    """Create (or empty) the merge scope for writers that fill it in SQL.
+
+    Fill it, then call ``merge_master(db, scoped=True)`` in the same
+    transaction.
+    """
+    db.execute(text(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {SCOPE_TABLE} (email TEXT PRIMARY KEY) ON COMMIT DROP
+    """))
+    db.execute(text(f"TRUNCATE {SCOPE_TABLE}"))
+
+
+def create_scope(db: Session, emails=None, brand=None):
+    open_scope(db)
+
+    if emails is not None:
+        scope = pd.DataFrame({"email": pd.Series(emails).dropna().unique()})
+        copy_dataframe(db, scope, SCOPE_TABLE, ["email"])
+    else:
+        # Everything currently in the brand table, plus anything master still
+        # flags for the brand so that removals get unflagged.
+        db.execute(text(f"""
+            INSERT INTO {SCOPE_TABLE} (email)
+            SELECT email FROM {brand.table}
+            UNION
+            SELECT email FROM master_emails WHERE {brand.member}
+        """))
+
+
+def merge_master(db: Session, emails=None, brand_code=None, scoped=False):
+    """Rebuild master_emails from the brand tables in one statement.
+
+    With neither ``emails``, ``brand_code`` nor ``scoped`` every brand row
+    is merged (full mode). Otherwise only the given emails, the emails
+    belonging to one brand, or with ``scoped`` the emails already put in
+    SCOPE_TABLE (see ``open_scope``), are recomputed (incremental mode).
+
+    Brand membership is written as brand_mask bits and segments as
+    master_email_segments rows, for every registered brand. Emails that are
+    no longer in any brand table are deleted from master; emails that left
+    only some brands lose those bits and segments. Rows whose values did
+    not change are not rewritten. The /stats aggregates are updated in the
+    same transaction, and MASTER_VERSION is bumped only when something was
+    written. Does not commit.
+    """
+    brands = brand_registry.all(db)
+    incremental = emails is not None or brand_code is not None or scoped
+    lock_stats(db)
+    if incremental:
+        if not scoped:
+            brand = brand_registry.by_code(db, brand_code) if brand_code is not None else None
+            if brand_code is not None and brand is None:
+                raise ValueError(f"Unknown brand code: {brand_code}")
+            create_scope(db, emails=emails, brand=brand)
+        adjust_audience(db, SCOPE_TABLE, -1)
+        source_filter = f"WHERE email IN (SELECT email FROM {SCOPE_TABLE})"
+        removal_filter = f"m.email IN (SELECT email FROM {SCOPE_TABLE}) AND"
+        segment_filter = f"s.email IN (SELECT email FROM {SCOPE_TABLE}) AND"
+    else:
+        source_filter = ""
+        removal_filter = ""
+        segment_filter = ""
+
+    sources = "\n            UNION ALL\n            ".join(
+        f"SELECT email, card_no, name, phone, segment, '{b.code}' AS brand, {b.bit} AS prio, "
+        f"{b.mask}::bigint AS mask FROM {b.table} {source_filter}"
+        for b in brands
+    )
+    not_in_brands = " AND ".join(
+        f"NOT EXISTS (SELECT 1 FROM {b.table} b WHERE b.email = m.email)"
+        for b in brands
+    )
+    tracked = ["card_no", "name", "phone", "brand_mask"]
+    tracked_list = ", ".join(tracked)
+    master_values = ", ".join(f"master_emails.{col}" for col in tracked)
+    excluded_values = ", ".join(f"EXCLUDED.{col}" for col in tracked)
+    update_set = ",\n                ".join(f"{col} = EXCLUDED.{col}" for col in tracked)
+
+    row = db.execute(text(f"""
+        WITH src AS (
+            {sources}
+        ),
+        merged AS (
+            SELECT
+                email,
+                (ARRAY_AGG(card_no ORDER BY prio))[1] AS card_no,
+                (ARRAY_AGG(name ORDER BY prio))[1] AS name,
+                (ARRAY_AGG(phone ORDER BY prio))[1] AS phone,
+                BIT_OR(mask) AS brand_mask
+            FROM src
+            GROUP BY email
+        ),
+        segments AS (
+            SELECT email, brand, segment FROM src WHERE segment IS NOT NULL
+        ),
+        segments_upserted AS (
+            INSERT INTO master_email_segments (email, brand, segment)
+            SELECT email, brand, segment FROM segments
+            ON CONFLICT (email, brand) DO UPDATE SET segment = EXCLUDED.segment
+            WHERE master_email_segments.segment IS DISTINCT FROM EXCLUDED.segment
+            RETURNING email
+        ),
+        segments_removed AS (
+            DELETE FROM master_email_segments s
+            WHERE {segment_filter}
+                NOT EXISTS (SELECT 1 FROM segments WHERE segments.email = s.email AND segments.brand = s.brand)
+            RETURNING email
+        ),
+        segments_changed AS (
+            SELECT email FROM segments_upserted
+            UNION
+            SELECT email FROM segments_removed
+        ),
+        upserted AS (
+            INSERT INTO master_emails (email, {tracked_list}, last_updated)
+            SELECT email, {tracked_list}, NOW() FROM merged
+            ON CONFLICT (email) DO UPDATE SET
+                {update_set},
+                last_updated = EXCLUDED.last_updated
+            WHERE ({master_values}) IS DISTINCT FROM ({excluded_values})
+                OR master_emails.email IN (SELECT email FROM segments_changed)
+            RETURNING (xmax = 0) AS inserted
+        ),
+        removed AS (
+            DELETE FROM master_emails m
+            WHERE {removal_filter} {not_in_brands}
+            RETURNING 1
+        )
+        SELECT
+            (SELECT COUNT(*) FROM merged) AS merged,
+            (SELECT COUNT(*) FILTER (WHERE inserted) FROM upserted) AS inserted,
+            (SELECT COUNT(*) FILTER (WHERE NOT inserted) FROM upserted) AS updated,
+            (SELECT COUNT(*) FROM removed) AS removed
+    """)).one()
+
+    if incremental:
+        adjust_audience(db, SCOPE_TABLE, 1)
+    else:
+        rebuild_stats(db)
+    if row.inserted or row.updated or row.removed:
+        bump_version(db, MASTER_VERSION)
+
+    return {
+        "mode": "incremental" if incremental else "full",
+        "inserted": row.inserted,
+        "updated": row.updated,
+        "unchanged": row.merged - row.inserted - row.updated,
+        "removed": row.removed,
+        "total": row.inserted + row.updated,
+    }
+
+
+def park_pending(db: Session, batch_id, emails=None):
+    """Queue emails in pending_merges for ``merge_pending``.
+
+    ``emails`` is a Series, COPY'd as it is; without it the current
+    SCOPE_TABLE is copied over in SQL. Does not commit.
+    """
+    if emails is None:
+        db.execute(text(f"""
+            INSERT INTO pending_merges (batch_id, email) SELECT :batch_id, email FROM {SCOPE_TABLE}
+        """), {"batch_id": batch_id})
+        return
+    pending = pd.DataFrame({"email": emails.dropna().unique()})
+    pending["batch_id"] = batch_id
+    copy_dataframe(db, pending, "pending_merges", ["batch_id", "email"])
+
+
+def merge_pending(db: Session, batch_id):
+    """Merge the emails a batch parked in pending_merges, then drop them.
+
+    See ``run_stream_pipeline``'s ``batch_id``. Returns the merge counts,
+    or None when the batch wrote nothing. Does not commit.
+    """
+    open_scope(db)
+    db.execute(text(f"""
+        INSERT INTO {SCOPE_TABLE} (email)
+        SELECT DISTINCT email FROM pending_merges WHERE batch_id = :batch_id
+        ON CONFLICT (email) DO NOTHING
+    """), {"batch_id": batch_id})
+    discard_pending(db, batch_id)
+    if not db.execute(text(f"SELECT EXISTS (SELECT 1 FROM {SCOPE_TABLE})")).scalar():
+        return None
+    return merge_master(db, scoped=True)
+
+
+def discard_pending(db: Session, batch_id):
+    """Forget a batch's pending emails. Does not commit."""
+    db.execute(text("DELETE FROM pending_merges WHERE batch_id = :batch_id"), {"batch_id": batch_id})
@@ -0,0 +1,169 @@
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request latencies: 5ms .. 10min, uploads sit at the top end
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labels, names):
+    return tuple(str(labels.get(name, "")) for name in names)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels, self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels, self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+# Metrics live in the process that recorded them; with several uvicorn
+# workers each one serves its own /metrics, so scrape them individually.
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", labels=("method", "route", "status")
+)
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds", "Time spent per upload pipeline stage.",
+    labels=("pipeline", "stage"), buckets=STAGE_BUCKETS
+)
+STAGE_ROWS = Counter("pipeline_stage_rows_total", "Rows handled per upload pipeline stage.", labels=("pipeline", "stage"))
+STAGE_STATEMENTS = Counter(
+    "pipeline_stage_db_statements_total", "Database statements issued per upload pipeline stage.",
+    labels=("pipeline", "stage")
+)
+DB_STATEMENTS = Counter("db_statements_total", "Database statements issued by this process.")
+RESPONSE_CACHE_REQUESTS = Counter(
+    "response_cache_requests_total", "Cached read requests by outcome (hit, miss, not_modified).",
+    labels=("scope", "result")
+)
+
+REGISTRY = [REQUEST_LATENCY, STAGE_SECONDS, STAGE_ROWS, STAGE_STATEMENTS, DB_STATEMENTS, RESPONSE_CACHE_REQUESTS]
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Statements issued in the current context, so a StageTimer can attribute
+# them to the stage that ran them. Each request / job thread gets its own.
+_statement_counter = contextvars.ContextVar("statement_counter", default=None)
+
+
+def record_statement():
+    """Count one database round trip (also called for raw COPY calls)."""
+    DB_STATEMENTS.inc()
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    record_statement()
+
+
+class StageTimer:
+    """Wall time, rows and DB statements per stage of one upload.
+
+    Call ``lap(stage, rows)`` when a stage finishes: the time and
+    statements since the previous lap are charged to it. ``pause()``
+    restarts the clock without charging anyone (e.g. after a progress
+    callback). ``publish()`` feeds the totals to the Prometheus metrics.
+    """
+
+    def __init__(self, pipeline, stages):
+        self.pipeline = pipeline
+        self.stages = {stage: {"seconds": 0.0, "rows": 0, "statements": 0} for stage in stages}
+        self._counter = [0]
+        _statement_counter.set(self._counter)
+        self._clock = time.perf_counter()
+        self._statements = 0
+
+    def lap(self, stage, rows=0):
+        now = time.perf_counter()
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "rows": 0, "statements": 0})
+        entry["seconds"] += now - self._clock
+        entry["rows"] += int(rows)
+        entry["statements"] += self._counter[0] - self._statements
+        self._clock = now
+        self._statements = self._counter[0]
+
+    def add(self, stage, seconds=0.0, rows=0, statements=0):
+        """Charge work measured elsewhere (e.g. in a worker process)."""
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "rows": 0, "statements": 0})
+        entry["seconds"] += seconds
+        entry["rows"] += int(rows)
+        entry["statements"] += statements
+
+    def pause(self):
+        self._clock = time.perf_counter()
+        self._statements = self._counter[0]
+
+    def report(self):
+        return {
+            stage: {**entry, "seconds": round(entry["seconds"], 4)}
+            for stage, entry in self.stages.items()
+        }
+
+    def publish(self):
+        for stage, entry in self.stages.items():
+            STAGE_SECONDS.observe(entry["seconds"], pipeline=self.pipeline, stage=stage)
+            STAGE_ROWS.inc(entry["rows"], pipeline=self.pipeline, stage=stage)
+            STAGE_STATEMENTS.inc(entry["statements"], pipeline=self.pipeline, stage=stage)
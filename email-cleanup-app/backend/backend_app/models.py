@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime
+from sqlalchemy import Column, String, DateTime, BigInteger, SmallInteger, Text, JSON, func
 from sqlalchemy.dialects.postgresql import VARCHAR
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -8,6 +8,13 @@ class InvalidEmail(Base):
     __tablename__ = "invalid_emails"
     email = Column(String, primary_key=True, index=True)
     brand = Column(String)
+    added_at = Column(DateTime, server_default=func.now(), index=True)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now())
 
 class EmailTR(Base):
     __tablename__ = "emails_tr"
@@ -42,10 +49,64 @@ class MasterEmail(Base):
     card_no = Column(String)
     name = Column(String)
     phone = Column(String)
-    segment_tr = Column(String)
-    segment_mfm = Column(String)
-    segment_nyss = Column(String)
-    is_tr = Column(Boolean, default=False)
-    is_mfm = Column(Boolean, default=False)
-    is_nyss = Column(Boolean, default=False)
+    # Bit ``brands.bit`` is set while the email is in that brand's table
+    brand_mask = Column(BigInteger, nullable=False, default=0, server_default="0")
     last_updated = Column(DateTime)
+
+class MasterEmailSegment(Base):
+    __tablename__ = "master_email_segments"
+    email = Column(String, primary_key=True)
+    brand = Column(String, primary_key=True)
+    segment = Column(String, nullable=False)
+
+class Brand(Base):
+    __tablename__ = "brands"
+    code = Column(String, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    bit = Column(SmallInteger, unique=True, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+class AudienceStat(Base):
+    __tablename__ = "audience_stats"
+    # "mask" (value = brand_mask), "segment" (brand code + segment) or
+    # "suppressed" (brand name of invalid_emails rows)
+    kind = Column(String, primary_key=True)
+    brand = Column(String, primary_key=True, default="")
+    value = Column(String, primary_key=True, default="")
+    count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now())
+
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+    id = Column(String, primary_key=True)
+    brand = Column(String)
+    filename = Column(String)
+    mode = Column(String, nullable=False, default="stream")
+    status = Column(String, nullable=False, default="queued", index=True)
+    progress = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class UploadFingerprint(Base):
+    __tablename__ = "upload_fingerprints"
+    sha256 = Column(String(64), primary_key=True)
+    brand = Column(String, primary_key=True)
+    mode = Column(String, primary_key=True)
+    rules_digest = Column(String(64), nullable=False)
+    brand_version = Column(BigInteger, nullable=False)
+    suppression_version = Column(BigInteger, nullable=False)
+    result = Column(JSON)
+    hits = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    last_hit_at = Column(DateTime)
+
+class PendingMerge(Base):
+    # Emails a batch wrote to brand tables and still has to merge into master
+    __tablename__ = "pending_merges"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    batch_id = Column(String, nullable=False, index=True)
+    email = Column(String, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
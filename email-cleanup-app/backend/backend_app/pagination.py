@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+TOTAL_MODES = ("exact", "estimate", "none")
+
+
+class CursorError(ValueError):
+    """Raised when a client sends a cursor token we did not issue."""
+
+
+def encode_cursor(*values):
+    """Opaque, URL-safe token for the sort key of the last row on a page."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, size):
+    """Values of a token from ``encode_cursor``; every one is a string."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise CursorError("Invalid cursor.") from e
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise CursorError("Invalid cursor.")
+    return values
+
+
+def cursor_datetime(value):
+    """Parse a datetime cursor value back, as CursorError if it is not one."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise CursorError("Invalid cursor.") from e
+
+
+def estimate_count(db: Session, query):
+    """Planner row estimate for ``query``: no table scan, may be off."""
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(db: Session, query, mode):
+    """Total for a listing: exact count, planner estimate or None."""
+    if mode == "exact":
+        return query.count()
+    if mode == "estimate":
+        return estimate_count(db, query)
+    return None
@@ -0,0 +1,92 @@
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import pandas as pd
+
+# Processes used to parse and validate an upload. 1 keeps everything in the
+# request thread; files smaller than PARALLEL_MIN_BYTES are always serial.
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+PARALLEL_MIN_BYTES = int(os.getenv("PARALLEL_MIN_BYTES", str(32 * 2**20)))
+# Roughly 100k rows of a typical brand export per range
+PARALLEL_RANGE_BYTES = int(os.getenv("PARALLEL_RANGE_BYTES", str(8 * 2**20)))
+
+_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def read_header(path):
+    """Column names as ``pd.read_csv`` sees them, and where the data starts."""
+    names = pd.read_csv(path, encoding="utf-8-sig", dtype=str, nrows=0).columns.tolist()
+    with open(path, "rb") as f:
+        f.readline()
+        return names, f.tell()
+
+
+def split_ranges(path, start, range_bytes=PARALLEL_RANGE_BYTES):
+    """Cut ``path`` from ``start`` into ``(start, end)`` byte ranges of whole records.
+
+    Each cut is moved forward to the next newline that is outside a quoted
+    field (an even number of quotes precedes it), so a multi-line value is
+    never split between two ranges.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    quotes = 0
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = range_start = start
+        while position < size:
+            target = min(size, range_start + range_bytes)
+            quotes += f.read(target - position).count(b'"')
+            position = target
+            while position < size:
+                line = f.readline()
+                quotes += line.count(b'"')
+                position += len(line)
+                if quotes % 2 == 0:
+                    break
+            ranges.append((range_start, position))
+            range_start = position
+    return ranges
+
+
+def read_range(path, start, end, names):
+    """Parse one byte range with the same options as the serial reader."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    try:
+        return pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=str, encoding="utf-8")
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame({name: pd.Series(dtype=str) for name in names})
+
+
+def map_ordered(fn, tasks, workers, initializer=None, initargs=()):
+    """Run ``fn`` over ``tasks`` in a process pool and yield results in task order.
+
+    At most ``2 * workers`` tasks are in flight, so a slow consumer (the
+    database stages) bounds how far parsing runs ahead. Workers come from
+    the forkserver (spawn where there is none), never a fork of this
+    multi-threaded server, which could copy a lock some other thread holds
+    and hang. ``initargs`` are pickled into each worker once per call, and
+    ``fn``'s module is preloaded in the forkserver so workers start warm.
+    """
+    if _CONTEXT.get_start_method() == "forkserver":
+        # Only takes effect before the forkserver's first start
+        _CONTEXT.set_forkserver_preload([fn.__module__])
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=_CONTEXT, initializer=initializer, initargs=initargs)
+    try:
+        tasks = iter(tasks)
+        pending = deque(pool.submit(fn, task) for task in islice(tasks, 2 * workers))
+        while pending:
+            result = pending.popleft().result()
+            for task in islice(tasks, 1):
+                pending.append(pool.submit(fn, task))
+            yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,320 @@
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from backend_app.brands import brand_code, brand_table
+from backend_app.bulk import BRAND_COLUMNS, apply_delta, bulk_upsert_brand, stage_delta, start_delta
+from backend_app.cleaning import normalize_emails, normalize_and_map_columns, to_records, transform_frame
+from backend_app.dedup import DUPLICATE_POLICIES, Deduplicator
+from backend_app.fingerprints import file_sha256, find_cached, remember, touch_brand
+from backend_app.merge import SCOPE_TABLE, merge_master, open_scope, park_pending
+from backend_app.metrics import StageTimer
+from backend_app.parallel import (
+    PARALLEL_MIN_BYTES, PARALLEL_RANGE_BYTES, PIPELINE_WORKERS, map_ordered, read_header, read_range, split_ranges
+)
+from backend_app.suppression import SUPPRESSION_VERSION
+from backend_app.validation import merge_counts, rules_for, suppressed_for, validate_series
+from backend_app.versions import get_version
+
+PIPELINE_CHUNK_ROWS = int(os.getenv("PIPELINE_CHUNK_ROWS", "50000"))
+PREVIEW_ROWS = 10
+INVALID_SAMPLE = 50
+STAGES = ["suppression_load", "read_csv", "map_columns", "validate", "transform", "dedup", "brand_upsert", "master_merge"]
+UPLOAD_MODES = ("stream", "delta")
+
+
+class PipelineError(Exception):
+    """Raised for problems with the uploaded file itself (reported as 400)."""
+
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.content = {"error": message, **details}
+
+
+def prepare_chunk(chunk, rules, suppressed, lap):
+    """Map columns, normalize and validate one parsed chunk.
+
+    Returns ``(chunk, rejected_by, counts)`` with ``chunk["email"]``
+    normalized. ``lap(stage, rows)`` is called as each step finishes.
+    """
+    chunk = normalize_and_map_columns(chunk)
+    missing_cols = [col for col in BRAND_COLUMNS if col not in chunk.columns]
+    if missing_cols:
+        raise PipelineError(f"Missing columns: {missing_cols}", detected_columns=chunk.columns.tolist())
+    lap("map_columns", len(chunk))
+
+    chunk["email"], rejected_by, counts = validate_series(normalize_emails(chunk["email"]), rules, suppressed)
+    lap("validate", len(chunk))
+    return chunk, rejected_by, counts
+
+
+# Per-process state of the parallel workers, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(rules, suppressed):
+    _worker["rules"] = rules
+    _worker["suppressed"] = suppressed
+
+
+def _prepare_range(task):
+    path, start, end, names = task
+    timings = {}
+    clock = time.perf_counter()
+
+    def lap(stage, rows):
+        nonlocal clock
+        now = time.perf_counter()
+        timings[stage] = (now - clock, rows)
+        clock = now
+
+    chunk = read_range(path, start, end, names)
+    lap("read_csv", len(chunk))
+    return prepare_chunk(chunk, _worker["rules"], _worker["suppressed"], lap), timings
+
+
+def _file_size(fileobj):
+    position = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(position)
+    return size
+
+
+def _iter_parallel_chunks(path, rules, suppressed, workers, timer, position, range_bytes):
+    names, data_start = read_header(path)
+    # Check the header once up front so workers never reject a range for it
+    mapped = normalize_and_map_columns(pd.DataFrame(columns=names)).columns.tolist()
+    missing_cols = [col for col in BRAND_COLUMNS if col not in mapped]
+    if missing_cols:
+        raise PipelineError(f"Missing columns: {missing_cols}", detected_columns=mapped)
+
+    ranges = split_ranges(path, data_start, range_bytes)
+    tasks = ((path, start, end, names) for start, end in ranges)
+    results = map_ordered(_prepare_range, tasks, workers, _init_worker, (rules, suppressed))
+    for (_, end), (prepared, timings) in zip(ranges, results):
+        timer.lap("parallel_wait", rows=len(prepared[0]))
+        position["bytes_read"] = end
+        for stage, (seconds, rows) in timings.items():
+            timer.add(stage, seconds, rows)
+        yield prepared
+
+
+def iter_prepared_chunks(fileobj, rules, suppressed, chunk_rows=PIPELINE_CHUNK_ROWS, workers=PIPELINE_WORKERS,
+                         timer=None, min_bytes=PARALLEL_MIN_BYTES, position=None, range_bytes=PARALLEL_RANGE_BYTES):
+    """Parse and validate an upload chunk by chunk, in file order.
+
+    With ``workers`` > 1 and a file of at least ``min_bytes``, the file
+    is cut into byte ranges of about ``range_bytes`` that a process pool
+    parses, normalizes and validates; otherwise chunks of ``chunk_rows``
+    are handled here.
+    Both yield the same rows in the same order, only the chunk boundaries
+    differ. In parallel mode the read_csv/map_columns/validate timings are
+    summed over the workers and the time spent waiting on them is charged
+    to ``parallel_wait``. If given, ``position["bytes_read"]`` is set to
+    how far into the file the yielded chunks reach (the parent's own file
+    offset does not move while workers read).
+    """
+    timer = timer or StageTimer("stream", STAGES)
+    position = {} if position is None else position
+
+    if workers > 1 and _file_size(fileobj) >= min_bytes:
+        path = getattr(fileobj, "name", None)
+        if isinstance(path, str) and os.path.isfile(path):
+            yield from _iter_parallel_chunks(path, rules, suppressed, workers, timer, position, range_bytes)
+            return
+        # Workers need a path to seek in; spool in-memory or unnamed uploads
+        with tempfile.NamedTemporaryFile(suffix=".csv") as spooled:
+            shutil.copyfileobj(fileobj, spooled)
+            spooled.flush()
+            timer.lap("spool")
+            yield from _iter_parallel_chunks(spooled.name, rules, suppressed, workers, timer, position, range_bytes)
+        return
+
+    reader = pd.read_csv(fileobj, encoding="utf-8-sig", dtype=str, chunksize=chunk_rows)
+    for chunk in reader:
+        timer.lap("read_csv", rows=len(chunk))
+        position["bytes_read"] = fileobj.tell()
+        yield prepare_chunk(chunk, rules, suppressed, lambda stage, rows: timer.lap(stage, rows=rows))
+
+
+def run_stream_pipeline(db: Session, fileobj, brand, rules, suppressed, chunk_rows=PIPELINE_CHUNK_ROWS,
+                        progress=None, timer=None, workers=PIPELINE_WORKERS, delta=False, batch_id=None):
+    """Clean and load an uploaded CSV in one pass.
+
+    The file is parsed in chunks of ``chunk_rows`` and each chunk goes
+    through normalize -> validation -> transform -> dedup -> brand upsert
+    -> master upsert before the next one is read, so memory stays bounded
+    by the chunk size (plus 9 bytes per distinct email for the dedup
+    stage, which applies the rule set's ``duplicate_policy`` across the
+    whole file). Each chunk is committed on its own; when an email
+    repeats across chunks the later row wins. Parsing and validation can
+    run in a process pool, see ``iter_prepared_chunks``.
+
+    With ``delta`` the brand table is made to mirror the file instead:
+    chunks are only staged, then new or changed rows are written, brand
+    rows whose email is not in the file are retired, and only those
+    emails are merged into master, all in one transaction.
+
+    With a ``batch_id`` master is left alone: the whole file is written to
+    the brand table in one transaction, and the emails master still has to
+    pick up are parked in pending_merges under that id (see ``run_batch``).
+
+    ``progress``, if given, is called after every chunk with the running
+    totals, ``bytes_read`` and per-stage timings. Stage time, rows and DB statements are
+    charged to ``timer`` (a new StageTimer if not given).
+    """
+    code = brand_code(db, brand)
+    if not code:
+        raise PipelineError("Unknown brand.")
+    brand = brand.strip()
+    table_name = brand_table(code)
+
+    totals = {"rows_uploaded": 0, "rows_after_invalid_removal": 0, "invalid_count": 0, "duplicates_collapsed": 0, "chunks": 0}
+    brand_totals = {"inserted": 0, "updated": 0, "duplicates_in_file": 0, "missing_email": 0}
+    if delta:
+        start_delta(db, table_name)
+    merge_totals = {"inserted": 0, "updated": 0, "unchanged": 0, "removed": 0, "total": 0}
+    timer = timer or StageTimer("stream", STAGES)
+    deduplicator = Deduplicator(rules.get("duplicate_policy", "last"))
+    rejections = {}
+    invalid_sample = []
+    preview = []
+    position = {}
+
+    chunks = iter_prepared_chunks(fileobj, rules, suppressed, chunk_rows=chunk_rows, workers=workers, timer=timer,
+                                  position=position)
+    for chunk, rejected_by, counts in chunks:
+        is_invalid = rejected_by.notna()
+        merge_counts(rejections, counts)
+
+        if len(invalid_sample) < INVALID_SAMPLE:
+            sample = chunk.loc[is_invalid, "email"].dropna().head(INVALID_SAMPLE - len(invalid_sample))
+            invalid_sample.extend(sample.tolist())
+
+        cleaned = transform_frame(chunk[~is_invalid].copy(), brand, code)
+        valid_rows = len(cleaned)
+        timer.lap("transform", rows=valid_rows)
+        cleaned = deduplicator.apply(cleaned)
+        if len(preview) < PREVIEW_ROWS:
+            preview.extend(to_records(cleaned.head(PREVIEW_ROWS - len(preview))))
+        timer.lap("dedup", rows=valid_rows)
+
+        if delta:
+            stage_delta(db, cleaned, table_name, totals["rows_after_invalid_removal"])
+            timer.lap("stage", rows=len(cleaned))
+        else:
+            brand_result = bulk_upsert_brand(db, cleaned, table_name)
+            timer.lap("brand_upsert", rows=len(cleaned))
+            for key in brand_totals:
+                brand_totals[key] += brand_result[key]
+            if batch_id:
+                park_pending(db, batch_id, cleaned["email"])
+            else:
+                merge_result = merge_master(db, emails=cleaned["email"])
+                db.commit()
+                timer.lap("master_merge", rows=len(cleaned))
+                for key in merge_totals:
+                    merge_totals[key] += merge_result[key]
+
+        totals["rows_uploaded"] += len(chunk)
+        totals["rows_after_invalid_removal"] += valid_rows
+        totals["invalid_count"] += int(is_invalid.sum())
+        totals["duplicates_collapsed"] = deduplicator.collapsed
+        totals["chunks"] += 1
+
+        if progress:
+            progress({**totals, **position, "timings": timer.report()})
+        timer.pause()
+
+    if delta:
+        if not totals["rows_after_invalid_removal"]:
+            # An empty or fully rejected export would otherwise wipe the brand
+            raise PipelineError("Delta upload has no valid rows; nothing was changed.")
+        open_scope(db)
+        brand_totals = apply_delta(db, table_name, SCOPE_TABLE)
+        changed = brand_totals.pop("changed")
+        timer.lap("brand_upsert", rows=brand_totals["staged"])
+        if batch_id:
+            park_pending(db, batch_id)
+        elif changed:
+            merge_totals = merge_master(db, scoped=True)
+        db.commit()
+        timer.lap("brand_upsert" if batch_id else "master_merge", rows=changed)
+    elif batch_id:
+        db.commit()
+        timer.lap("brand_upsert")
+
+    timer.publish()
+
+    result = {
+        **totals,
+        "invalid_emails": invalid_sample,
+        "rejections": rejections,
+        "preview": preview,
+        "timings": timer.report(),
+        "brand_result": brand_totals,
+    }
+    if batch_id:
+        return {**result, "merge_result": None}
+    return {**result, "merge_result": {"status": "success", "mode": "incremental", **merge_totals}}
+
+
+def run_upload(db: Session, fileobj, brand, progress=None, mode="stream", workers=PIPELINE_WORKERS, batch_id=None):
+    """Run the streaming pipeline and shape the /upload response.
+
+    The file is fingerprinted first: if the same bytes were already
+    uploaded for this brand in this mode, and neither the brand table,
+    the suppression list nor the rules changed since, the stored result
+    is returned with ``cached: true`` and nothing is reprocessed.
+    ``mode`` is "stream" (upsert every row) or "delta" (see
+    ``run_stream_pipeline``, which also covers ``workers`` and
+    ``batch_id``).
+    """
+    if mode not in UPLOAD_MODES:
+        raise PipelineError(f"Unknown mode. Use one of {list(UPLOAD_MODES)}.")
+    code = brand_code(db, brand)
+    if not code:
+        raise PipelineError("Unknown brand.")
+    rules = rules_for(brand)
+    if rules.get("duplicate_policy", "last") not in DUPLICATE_POLICIES:
+        raise PipelineError(f"duplicate_policy must be one of {list(DUPLICATE_POLICIES)}.")
+
+    timer = StageTimer(mode, ["fingerprint"] + STAGES)
+    fingerprint = file_sha256(fileobj)
+    cached = find_cached(db, fingerprint, code, mode, rules)
+    timer.lap("fingerprint")
+    if cached is not None:
+        return {**cached, "cached": True, "timings": timer.report()}
+
+    # Claim a brand version up front: any earlier fingerprint for this brand
+    # stops matching even if this upload fails half way
+    brand_version = touch_brand(db, code)
+    suppression_version = get_version(db, SUPPRESSION_VERSION)
+    db.commit()
+
+    suppressed = suppressed_for(db, brand, rules)
+    timer.lap("suppression_load", rows=len(suppressed))
+    result = run_stream_pipeline(
+        db, fileobj, brand, rules, suppressed, progress=progress, timer=timer, workers=workers,
+        delta=(mode == "delta"), batch_id=batch_id
+    )
+    brand_result = result.pop("brand_result")
+    response = {
+        "status": "success",
+        "brand": brand,
+        "mode": mode,
+        "fingerprint": fingerprint,
+        "transformed_file": None,
+        "inserted_to_brand": brand_result["inserted"],
+        "updated_in_brand": brand_result["updated"],
+        **({"unchanged_in_brand": brand_result["unchanged"], "retired_from_brand": brand_result["retired"]}
+           if mode == "delta" else {}),
+        **result
+    }
+    remember(db, fingerprint, code, mode, rules, brand_version, suppression_version, response)
+    db.commit()
+    return {**response, "cached": False}
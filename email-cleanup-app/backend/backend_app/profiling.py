@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+
+from fastapi.routing import APIRoute
+
+# Off unless PROFILING_ENABLED=1; then a request opts in with "X-Profile: 1"
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILER = os.getenv("PROFILER", "cprofile")
+PROFILE_FOLDER = os.getenv("PROFILE_FOLDER", os.path.join("temp_uploads", "profiles"))
+PROFILE_HEADER = "x-profile"
+
+# Set by the request middleware to a dict the endpoint wrapper fills with
+# the report path; the dict is shared even when the endpoint runs in a
+# threadpool copy of the context.
+profile_request = contextvars.ContextVar("profile_request", default=None)
+
+
+def wants_profile(request):
+    return PROFILING_ENABLED and request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+
+
+def _report_path(name, extension):
+    os.makedirs(PROFILE_FOLDER, exist_ok=True)
+    return os.path.join(PROFILE_FOLDER, f"{time.strftime('%Y%m%d_%H%M%S')}_{name}.{extension}")
+
+
+class _Profile:
+    """cProfile by default; pyinstrument when PROFILER=pyinstrument and installed."""
+
+    def __init__(self, name):
+        self.name = name
+        self.pyinstrument = None
+        if PROFILER == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+                self.pyinstrument = Profiler(async_mode="disabled")
+            except ImportError:
+                print("⚠️ pyinstrument not installed, falling back to cProfile")
+        self.cprofile = None if self.pyinstrument else cProfile.Profile()
+
+    def __enter__(self):
+        if self.pyinstrument:
+            self.pyinstrument.start()
+        else:
+            self.cprofile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.pyinstrument:
+            self.pyinstrument.stop()
+            path = _report_path(self.name, "html")
+            with open(path, "w") as f:
+                f.write(self.pyinstrument.output_html())
+        else:
+            self.cprofile.disable()
+            path = _report_path(self.name, "prof")
+            self.cprofile.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(self.cprofile, stream=summary).sort_stats("cumulative").print_stats(50)
+            with open(path[:-len(".prof")] + ".txt", "w") as f:
+                f.write(summary.getvalue())
+        request = profile_request.get()
+        if request is not None:
+            request["report"] = path
+        print(f"🔬 Profile written to {path}")
+
+
+def profiled(endpoint):
+    """Wrap an endpoint so an opted-in request runs under the profiler.
+
+    The wrapper runs where the endpoint runs: for plain ``def`` handlers
+    that is FastAPI's worker thread, which a profiler started in the
+    middleware would not see.
+    """
+    name = endpoint.__name__
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            if profile_request.get() is None:
+                return await endpoint(*args, **kwargs)
+            with _Profile(name):
+                return await endpoint(*args, **kwargs)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            if profile_request.get() is None:
+                return endpoint(*args, **kwargs)
+            with _Profile(name):
+                return endpoint(*args, **kwargs)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint) if PROFILING_ENABLED else endpoint, **kwargs)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from backend_app.metrics import RESPONSE_CACHE_REQUESTS
+from backend_app.versions import get_versions
+
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 2**20)))
+
+
+def make_etag(scope, versions, params):
+    """Strong validator for a read: the data versions it depends on plus its query."""
+    key = json.dumps([scope, sorted(versions.items()), sorted(params)])
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:24] + '"'
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header names ``etag`` (weak comparison, per RFC 9110)."""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class ResponseCache:
+    """In-process LRU of rendered JSON bodies, keyed by ETag.
+
+    An ETag already encodes the data versions a body was built from, so an
+    entry can never be served for newer data. When a scope's versions move,
+    its older entries are dropped at once instead of waiting to age out.
+    Bounded both by entry count and by total body size; a body larger than
+    the byte budget on its own is served but not kept.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._bytes = 0
+
+    def get(self, scope, versions, etag):
+        with self._lock:
+            if self._versions.get(scope) != versions:
+                self._versions[scope] = versions
+                for key in [key for key, (owner, _) in self._entries.items() if owner == scope]:
+                    self._drop(key)
+                return None
+            entry = self._entries.get(etag)
+            if entry is None:
+                return None
+            self._entries.move_to_end(etag)
+            return entry[1]
+
+    def put(self, scope, etag, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if etag in self._entries:
+                self._drop(etag)
+            self._entries[etag] = (scope, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "versions": dict(self._versions)}
+
+    def _drop(self, etag):
+        _, body = self._entries.pop(etag)
+        self._bytes -= len(body)
+
+
+response_cache = ResponseCache()
+
+
+def serve_cached(request, db, scope, version_names, build):
+    """Answer a read from ``build()`` with an ETag, a 304 or a cached body.
+
+    ``build`` returns the JSON content, or a Response (an error) that is
+    passed through uncached. Costs one read of data_versions when the
+    client or the cache already has the answer.
+    """
+    versions = get_versions(db, version_names)
+    etag = make_etag(scope, versions, request.query_params.multi_items())
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        RESPONSE_CACHE_REQUESTS.inc(scope=scope, result="not_modified")
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(scope, versions, etag)
+    if body is None:
+        content = build()
+        if isinstance(content, Response):
+            return content
+        body = JSONResponse(jsonable_encoder(content)).body
+        response_cache.put(scope, etag, body)
+        RESPONSE_CACHE_REQUESTS.inc(scope=scope, result="miss")
+    else:
+        RESPONSE_CACHE_REQUESTS.inc(scope=scope, result="hit")
+    return Response(content=body, media_type="application/json", headers=headers)
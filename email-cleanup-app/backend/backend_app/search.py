@@ -0,0 +1,56 @@
+from sqlalchemy import func, select, text
+
+from backend_app.brands import parse_brand_codes
+from backend_app.models import InvalidEmail, MasterEmail, MasterEmailSegment
+
+# {brand code: segment} of a master row, for listing and export
+SEGMENTS = (
+    select(func.json_object_agg(MasterEmailSegment.brand, MasterEmailSegment.segment))
+    .where(MasterEmailSegment.email == MasterEmail.email)
+    .correlate(MasterEmail)
+    .scalar_subquery()
+    .label("segments")
+)
+
+
+def escape_like(term):
+    """Escape LIKE wildcards so user input matches literally."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contains(column, term):
+    # Served by the pg_trgm GIN indexes created in init_db (terms of 3+ chars)
+    return column.ilike(f"%{escape_like(term)}%", escape="\\")
+
+
+def filter_master(query, search=None, brand=None, segment=None, include=None, exclude=None):
+    """Apply the /master-emails search, brand and segment filters.
+
+    ``include`` and ``exclude`` are comma-separated brand codes: a row must
+    be in every included brand and in none of the excluded ones. ``brand``
+    is a single included code. Each included brand is its own predicate, so
+    the planner can walk that brand's partial index. Raises ValueError on
+    an unknown code.
+    """
+    db = query.session
+    if search:
+        query = query.filter(contains(MasterEmail.email, search))
+    for included in parse_brand_codes(db, ",".join(filter(None, [brand, include]))):
+        query = query.filter(text(included.member))
+    excluded = sum(b.mask for b in parse_brand_codes(db, exclude))
+    if excluded:
+        query = query.filter(text(f"(brand_mask & {excluded}::bigint) = 0"))
+    if segment:
+        query = query.filter(MasterEmail.email.in_(
+            select(MasterEmailSegment.email).where(contains(MasterEmailSegment.segment, segment))
+        ))
+    return query
+
+
+def filter_invalid(query, search=None, brand=None):
+    """Apply the /invalid-emails search and brand filters."""
+    if search:
+        query = query.filter(contains(InvalidEmail.email, search))
+    if brand:
+        query = query.filter(InvalidEmail.brand == brand)
+    return query
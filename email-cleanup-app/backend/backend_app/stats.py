@@ -0,0 +1,140 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend_app.versions import bump_version
+
+STATS_VERSION = "audience_stats"
+STATS_REBUILT = "audience_stats:rebuilt"
+
+# Each count query yields (kind, brand, value, n) rows for audience_stats
+MASK_COUNTS = """
+    SELECT 'mask' AS kind, '' AS brand, brand_mask::text AS value, COUNT(*) AS n
+    FROM master_emails {where} GROUP BY brand_mask
+"""
+SEGMENT_COUNTS = """
+    SELECT 'segment', brand, segment, COUNT(*)
+    FROM master_email_segments {where} GROUP BY brand, segment
+"""
+SUPPRESSED_COUNTS = """
+    SELECT 'suppressed', COALESCE(brand, ''), '', COUNT(*)
+    FROM invalid_emails GROUP BY brand
+"""
+
+
+def _add_counts(db, counts_sql, params=None):
+    db.execute(text(f"""
+        INSERT INTO audience_stats (kind, brand, value, count, updated_at)
+        SELECT kind, brand, value, n, NOW() FROM ({counts_sql}) AS counts
+        ON CONFLICT (kind, brand, value) DO UPDATE SET
+            count = audience_stats.count + EXCLUDED.count,
+            updated_at = EXCLUDED.updated_at
+    """), params or {})
+
+
+def lock_stats(db: Session):
+    """Claim the aggregates for this transaction; returns the new stats version.
+
+    Bumping the version row-locks it until commit, so writers that adjust
+    the aggregates run one at a time and each one's before/after counts
+    see the previous one's committed rows. Call it before reading anything
+    the write will change.
+    """
+    return bump_version(db, STATS_VERSION)
+
+
+def adjust_audience(db: Session, scope_table, sign):
+    """Add (``sign=1``) or take away (``sign=-1``) the scope's master and segment counts.
+
+    A write to master_emails confined to the emails in ``scope_table`` is
+    bracketed by ``-1`` before and ``+1`` after; the difference is exactly
+    what the write changed, at the cost of two grouped reads of the scope.
+    """
+    where = f"WHERE email IN (SELECT email FROM {scope_table})"
+    counts = f"{MASK_COUNTS.format(where=where)} UNION ALL {SEGMENT_COUNTS.format(where=where)}"
+    _add_counts(db, f"SELECT kind, brand, value, {int(sign)} * n AS n FROM ({counts}) AS scoped")
+    if sign > 0:
+        db.execute(text("DELETE FROM audience_stats WHERE count = 0 AND kind <> 'suppressed'"))
+
+
+def add_suppressed(db: Session, brand, added):
+    """Count ``added`` new invalid_emails rows for ``brand``. Does not commit."""
+    if not added:
+        return
+    lock_stats(db)
+    _add_counts(db, "SELECT 'suppressed' AS kind, :brand AS brand, '' AS value, :n AS n",
+                {"brand": brand or "", "n": added})
+
+
+def rebuild_stats(db: Session):
+    """Recount every aggregate from the tables. Does not commit."""
+    lock_stats(db)
+    db.execute(text("DELETE FROM audience_stats"))
+    _add_counts(db, " UNION ALL ".join([MASK_COUNTS.format(where=""), SEGMENT_COUNTS.format(where=""), SUPPRESSED_COUNTS]))
+    bump_version(db, STATS_REBUILT)
+
+
+def init_stats(conn):
+    """First start (or an emptied data_versions): build the aggregates once."""
+    built = conn.execute(text("SELECT 1 FROM data_versions WHERE name = :name"), {"name": STATS_REBUILT}).first()
+    if not built:
+        rebuild_stats(conn)
+
+
+def read_stats(db: Session, brands):
+    """Per-brand, overlap, segment and suppression counts from the aggregates.
+
+    Nothing here scans master_emails: per-brand and overlap counts are sums
+    over the (few) distinct brand_mask values.
+    """
+    masks, segments, suppressed = {}, {}, {}
+    for kind, brand, value, count in db.execute(text("SELECT kind, brand, value, count FROM audience_stats")):
+        if kind == "mask":
+            masks[int(value)] = count
+        elif kind == "segment":
+            segments.setdefault(brand, {})[value] = count
+        elif kind == "suppressed":
+            suppressed[brand] = count
+
+    brand_counts = {
+        b.code: {
+            "name": b.name,
+            "contacts": sum(n for mask, n in masks.items() if mask & b.mask),
+            "exclusive": masks.get(b.mask, 0),
+        }
+        for b in brands
+    }
+    overlap = {
+        b.code: {
+            other.code: sum(n for mask, n in masks.items() if mask & b.mask and mask & other.mask)
+            for other in brands
+        }
+        for b in brands
+    }
+
+    versions = {
+        row.name: row
+        for row in db.execute(text("""
+            SELECT name, version, updated_at, EXTRACT(EPOCH FROM NOW() - updated_at) AS age
+            FROM data_versions WHERE name IN (:stats, :rebuilt)
+        """), {"stats": STATS_VERSION, "rebuilt": STATS_REBUILT})
+    }
+    current, rebuilt = versions.get(STATS_VERSION), versions.get(STATS_REBUILT)
+
+    return {
+        "contacts": sum(masks.values()),
+        "brands": brand_counts,
+        "overlap": overlap,
+        "segments": {b.code: segments.get(b.code, {}) for b in brands},
+        "suppressed": {
+            "total": sum(suppressed.values()),
+            "by_brand": suppressed,
+        },
+        # Aggregates change in the same transaction as the rows they count,
+        # so they are exact as of updated_at
+        "freshness": {
+            "version": current.version if current else 0,
+            "updated_at": current.updated_at if current else None,
+            "age_seconds": round(float(current.age), 3) if current else None,
+            "rebuilt_at": rebuilt.updated_at if rebuilt else None,
+        },
+    }
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend_app.versions import get_version
+
+SUPPRESSION_VERSION = "invalid_emails"
+
+# Rows are picked up by their added_at watermark. A transaction that started
+# before the last load but committed after it carries an older timestamp, so
+# each delta re-reads this much history; re-adding known emails is harmless.
+DELTA_OVERLAP = timedelta(seconds=int(os.getenv("SUPPRESSION_DELTA_OVERLAP_SECONDS", "600")))
+EPOCH = datetime(1970, 1, 1)
+
+
+class SuppressionCache:
+    """In-process copy of the invalid_emails table, kept per brand.
+
+    Every lookup costs one primary-key read of ``data_versions``. While the
+    version is unchanged the cached sets are returned as-is. When it moves,
+    only rows added since the last watermark are fetched.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._all = set()
+        self._by_brand = {}
+        self._version = None
+        self._watermark = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "reloads": 0,
+            "delta_refreshes": 0,
+            "rows_loaded": 0,
+            "last_load_seconds": 0.0,
+        }
+
+    def emails(self, db: Session, brand=None):
+        """Set of suppressed emails, across all brands or for one brand."""
+        self._refresh(db)
+        if brand is None:
+            return self._all
+        return self._by_brand.get(brand, set())
+
+    def invalidate(self):
+        """Force a full reload on the next lookup."""
+        with self._lock:
+            self._version = None
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "version": self._version,
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            "size": len(self._all),
+            "brands": {brand: len(emails) for brand, emails in self._by_brand.items()},
+        }
+
+    def _refresh(self, db: Session):
+        version = get_version(db, SUPPRESSION_VERSION)
+        with self._lock:
+            if self._version is not None and version == self._version:
+                self.stats["hits"] += 1
+                return
+
+            started = time.perf_counter()
+            if self._version is None:
+                self.stats["misses"] += 1
+                if self._watermark is not None:
+                    self.stats["reloads"] += 1
+                rows = db.execute(text("SELECT email, brand, added_at FROM invalid_emails")).all()
+                all_emails, by_brand, watermark = set(), {}, EPOCH
+            else:
+                self.stats["delta_refreshes"] += 1
+                rows = db.execute(
+                    text("SELECT email, brand, added_at FROM invalid_emails WHERE added_at >= :since"),
+                    {"since": self._watermark - DELTA_OVERLAP}
+                ).all()
+                # Copy on write: callers may still be reading the old sets
+                all_emails = set(self._all) if rows else self._all
+                by_brand = {brand: set(emails) for brand, emails in self._by_brand.items()} if rows else self._by_brand
+                watermark = self._watermark
+
+            for email, brand, added_at in rows:
+                if not email:
+                    continue
+                all_emails.add(email)
+                by_brand.setdefault(brand, set()).add(email)
+                if added_at and added_at > watermark:
+                    watermark = added_at
+
+            self._all, self._by_brand, self._watermark = all_emails, by_brand, watermark
+            self._version = version
+            self.stats["rows_loaded"] += len(rows)
+            self.stats["last_load_seconds"] = round(time.perf_counter() - started, 4)
+
+
+suppression_cache = SuppressionCache()
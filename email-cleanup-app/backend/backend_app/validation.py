@@ -0,0 +1,231 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+
+from backend_app.suppression import suppression_cache
+
+EMAIL_PATTERN = (
+    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}"
+)
+
+EMPTY_VALUES = ["", "nan", "none", "null", "n/a", "-"]
+
+DISPOSABLE_DOMAINS = {
+    "mailinator.com", "guerrillamail.com", "guerrillamail.net", "sharklasers.com",
+    "10minutemail.com", "temp-mail.org", "tempmail.com", "tempmail.net", "throwawaymail.com",
+    "yopmail.com", "trashmail.com", "getnada.com", "dispostable.com", "maildrop.cc",
+    "fakeinbox.com", "mintemail.com", "mohmal.com", "emailondeck.com", "spamgourmet.com",
+}
+
+ROLE_ACCOUNTS = {
+    "admin", "administrator", "info", "support", "sales", "contact", "hello", "help",
+    "noreply", "no-reply", "donotreply", "postmaster", "webmaster", "hostmaster", "abuse",
+    "marketing", "office", "billing", "accounts", "enquiries", "enquiry", "hr", "careers",
+}
+
+# Misspelt domain -> intended domain
+TYPO_DOMAINS = {
+    "gmial.com": "gmail.com", "gmai.com": "gmail.com", "gamil.com": "gmail.com",
+    "gnail.com": "gmail.com", "gmaill.com": "gmail.com", "gmail.co": "gmail.com",
+    "gmail.con": "gmail.com", "gmail.cm": "gmail.com", "gmail.om": "gmail.com",
+    "hotmial.com": "hotmail.com", "hotmal.com": "hotmail.com", "hotmail.co": "hotmail.com",
+    "hotmail.con": "hotmail.com", "hotmil.com": "hotmail.com",
+    "yahooo.com": "yahoo.com", "yaho.com": "yahoo.com", "yahoo.co": "yahoo.com",
+    "yahoo.con": "yahoo.com", "yhoo.com": "yahoo.com",
+    "outlok.com": "outlook.com", "outloo.com": "outlook.com", "outlook.co": "outlook.com",
+    "outlook.con": "outlook.com", "iclod.com": "icloud.com", "icloud.co": "icloud.com",
+}
+
+# Mailbox providers that deliver several spellings of an address to one
+# inbox. "tag" starts a sub-address to drop ("a+promo" -> "a"), "dots" means
+# dots in the local part are ignored, "domain" is the provider's main domain.
+# Only Gmail is folded by default: it documents both rules for every account.
+CANONICAL_PROVIDERS = {
+    "gmail.com": {"tag": "+", "dots": True},
+    "googlemail.com": {"tag": "+", "dots": True, "domain": "gmail.com"},
+}
+# Providers where "+" sub-addressing exists but may be switched off or
+# mean a separate alias; folded only with the "plus_tag_providers" rule.
+# Yahoo's "-" addresses are separate disposable mailboxes and are never
+# folded unless a rule set lists them in "extra_canonical_providers".
+PLUS_TAG_PROVIDERS = {
+    "outlook.com": {"tag": "+"}, "hotmail.com": {"tag": "+"}, "live.com": {"tag": "+"},
+    "icloud.com": {"tag": "+"}, "me.com": {"tag": "+"}, "mac.com": {"tag": "+"},
+    "protonmail.com": {"tag": "+"}, "proton.me": {"tag": "+"}, "pm.me": {"tag": "+"},
+    "fastmail.com": {"tag": "+"},
+}
+
+# Rule switches. "typo_domains" is "reject", "fix" or "off"; "suppression" is
+# "all" (every brand's invalid list), "brand" (only this brand's) or "off".
+# "canonicalize" rewrites emails with CANONICAL_PROVIDERS (plus
+# PLUS_TAG_PROVIDERS when "plus_tag_providers" is on); "duplicate_policy"
+# picks the row kept when an email repeats in an upload (see dedup.py).
+DEFAULT_RULES = {
+    "syntax": True,
+    "typo_domains": "reject",
+    "disposable": True,
+    "role_accounts": False,
+    "suppression": "all",
+    "canonicalize": True,
+    "plus_tag_providers": False,
+    "duplicate_policy": "last",
+    "extra_disposable_domains": [],
+    "extra_role_accounts": [],
+    "extra_typo_domains": {},
+    "extra_canonical_providers": {},
+}
+
+BRAND_RULES = {
+    "Tony Romas": {},
+    "The Manhattan Fish Market": {},
+    "New York Steak Shack": {},
+}
+
+# Optional JSON file: {"default": {...}, "brands": {"Tony Romas": {...}}}
+VALIDATION_RULES_FILE = os.getenv("VALIDATION_RULES_FILE")
+if VALIDATION_RULES_FILE and os.path.exists(VALIDATION_RULES_FILE):
+    with open(VALIDATION_RULES_FILE) as f:
+        _overrides = json.load(f)
+    DEFAULT_RULES.update(_overrides.get("default", {}))
+    for _brand, _rules in _overrides.get("brands", {}).items():
+        BRAND_RULES.setdefault(_brand, {}).update(_rules)
+
+
+def rules_for(brand):
+    """Effective rule set for a brand: defaults plus the brand's overrides."""
+    return {**DEFAULT_RULES, **BRAND_RULES.get((brand or "").strip(), {})}
+
+
+def suppressed_for(db, brand, rules):
+    """Suppression set selected by the rule set's ``suppression`` scope."""
+    scope = rules.get("suppression", "all")
+    if scope == "off":
+        return set()
+    return suppression_cache.emails(db, brand.strip() if scope == "brand" else None)
+
+
+def canonical_providers(rules):
+    """Provider rules a rule set canonicalizes with (empty when it is off)."""
+    if not rules.get("canonicalize", True):
+        return {}
+    return {
+        **CANONICAL_PROVIDERS,
+        **(PLUS_TAG_PROVIDERS if rules.get("plus_tag_providers") else {}),
+        **rules.get("extra_canonical_providers", {}),
+    }
+
+
+def canonicalize_emails(emails, rules):
+    """Rewrite normalized emails to their provider's canonical spelling.
+
+    ``john.doe+promo@googlemail.com`` -> ``johndoe@gmail.com``. Domains
+    without a provider rule, and values that are not ``local@domain``, are
+    returned unchanged. Off when the rule set's ``canonicalize`` is false.
+    """
+    providers = canonical_providers(rules)
+    if not providers:
+        return emails
+    emails = emails.astype("string")
+    domain = emails.str.replace(r"^[^@]*@", "", regex=True)
+    known = (domain.isin(list(providers)) & emails.str.contains("@", regex=False)).to_numpy(dtype=bool, na_value=False)
+    if not known.any():
+        return emails
+
+    domain = domain[known]
+    local = emails[known].str.replace(r"@[^@]*$", "", regex=True)
+    tags = domain.map({d: rule.get("tag") for d, rule in providers.items()})
+    for tag in tags.dropna().unique():
+        tagged = (tags == tag).to_numpy(dtype=bool, na_value=False)
+        # A leading tag ("+x@") would leave nothing; keep those as they are
+        untagged = local[tagged].str.replace(re.escape(tag) + ".*$", "", regex=True)
+        local[tagged] = untagged.where(untagged != "", local[tagged])
+    dots = domain.map({d: bool(rule.get("dots")) for d, rule in providers.items()}).to_numpy(dtype=bool)
+    local[dots] = local[dots].str.replace(".", "", regex=False)
+    domain = domain.map({d: rule.get("domain", d) for d, rule in providers.items()})
+
+    emails = emails.copy()
+    emails[known] = local + "@" + domain
+    return emails
+
+
+def _suppressed_mask(emails, suppressed):
+    # Series.isin re-hashes its whole argument on every call, which costs
+    # more than the batch itself once the suppression list has millions of
+    # entries. Probing the cached set is linear in the batch only.
+    values = emails.to_numpy(dtype=object, na_value=None)
+    return np.fromiter((e in suppressed for e in values), dtype=bool, count=len(values))
+
+
+def validate_series(emails, rules, suppressed=()):
+    """Apply a rule set to a Series of normalized emails.
+
+    Returns ``(emails, rejected_by, counts)``. ``emails`` is the input with
+    typo domains corrected when ``typo_domains`` is "fix" and valid emails
+    in canonical form (see ``canonicalize_emails``). ``rejected_by``
+    names the first rule each row failed, or is None for valid rows.
+    ``counts`` holds rejections per enabled rule and the number of
+    corrected typos. All checks are vectorized over the whole Series.
+    """
+    emails = emails.astype("string")
+    rejected_by = np.full(len(emails), None, dtype=object)
+    pending = np.ones(len(emails), dtype=bool)
+    counts = {}
+
+    def reject(rule, mask):
+        mask = np.asarray(mask, dtype=bool) & pending
+        rejected_by[mask] = rule
+        pending[mask] = False
+        counts[rule] = int(mask.sum())
+
+    reject("empty", (emails.isna() | emails.isin(EMPTY_VALUES)).to_numpy(dtype=bool, na_value=True))
+
+    if rules.get("syntax", True):
+        reject("syntax", ~emails.str.fullmatch(EMAIL_PATTERN).to_numpy(dtype=bool, na_value=False))
+
+    domains = emails.str.replace(r"^[^@]*@", "", regex=True)
+
+    typo_action = rules.get("typo_domains", "reject")
+    if typo_action in ("reject", "fix"):
+        typos = {**TYPO_DOMAINS, **rules.get("extra_typo_domains", {})}
+        is_typo = domains.isin(list(typos)).to_numpy(dtype=bool, na_value=False) & pending
+        if typo_action == "fix":
+            fixed = domains[is_typo].map(typos)
+            emails = emails.copy()
+            emails[is_typo] = emails[is_typo].str.replace(r"@[^@]*$", "@", regex=True) + fixed
+            domains[is_typo] = fixed
+            counts["typo_domain_fixed"] = int(is_typo.sum())
+        else:
+            reject("typo_domain", is_typo)
+
+    received = emails
+    if rules.get("canonicalize", True) and pending.any():
+        canonical = canonicalize_emails(emails[pending], rules)
+        changed = (canonical != emails[pending]).to_numpy(dtype=bool, na_value=False)
+        emails = emails.copy()
+        emails[pending] = canonical
+        domains = emails.str.replace(r"^[^@]*@", "", regex=True)
+        counts["canonicalized"] = int(changed.sum())
+
+    if rules.get("disposable", True):
+        disposable = DISPOSABLE_DOMAINS | set(rules.get("extra_disposable_domains", []))
+        reject("disposable_domain", domains.isin(list(disposable)).to_numpy(dtype=bool, na_value=False))
+
+    if rules.get("role_accounts", False):
+        roles = ROLE_ACCOUNTS | set(rules.get("extra_role_accounts", []))
+        role_pattern = "(?:" + "|".join(re.escape(r) for r in sorted(roles)) + ")@"
+        reject("role_account", emails.str.match(role_pattern).to_numpy(dtype=bool, na_value=False))
+
+    if rules.get("suppression", "all") != "off":
+        # The list may hold either spelling of an address
+        reject("suppressed", _suppressed_mask(emails, suppressed) | _suppressed_mask(received, suppressed))
+
+    return emails, pd.Series(rejected_by, index=emails.index), counts
+
+
+def merge_counts(total, counts):
+    for rule, count in counts.items():
+        total[rule] = total.get(rule, 0) + count
+    return total
@@ -0,0 +1,30 @@
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+
+def get_version(db: Session, name):
+    """Current version number of a named dataset (0 if never written)."""
+    version = db.execute(text("SELECT version FROM data_versions WHERE name = :name"), {"name": name}).scalar()
+    return version or 0
+
+
+def bump_version(db: Session, name):
+    """Increment a dataset's version inside the caller's transaction."""
+    return db.execute(text("""
+        INSERT INTO data_versions (name, version, updated_at)
+        VALUES (:name, 1, NOW())
+        ON CONFLICT (name) DO UPDATE SET
+            version = data_versions.version + 1,
+            updated_at = NOW()
+        RETURNING version
+    """), {"name": name}).scalar()
+
+
+def get_versions(db: Session, names):
+    """Current versions of several datasets in one read, as ``{name: version}``."""
+    rows = db.execute(
+        text("SELECT name, version FROM data_versions WHERE name IN :names").bindparams(bindparam("names", expanding=True)),
+        {"names": list(names)}
+    ).all()
+    found = dict(rows)
+    return {name: found.get(name, 0) for name in names}
@@ -0,0 +1,127 @@
+"""Sequential /upload calls vs one /upload/batch for the nightly brand files.
+
+Generates one brand CSV per default brand (overlapping customer bases),
+then on an emptied database uploads them one after another, records the
+resulting brand tables, master list and /stats aggregates, empties the
+database again and sends the same files as one batch. The two runs must
+leave identical tables or the script exits non-zero. Prints the wall
+time of each run next to the slowest single file, which is what a batch
+should approach.
+
+    python -m benchmarks.batch_benchmark --rows 200000 --mode stream --reset
+
+Each run starts from empty brand, master and invalid-email tables, so
+the script refuses to run without ``--reset``: only pass it against a
+throwaway database.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from benchmarks.datasets import generate_brand_csv
+from benchmarks.suite import reset_database
+from backend_app.brands import DEFAULT_BRANDS, brand_table
+
+SNAPSHOT_QUERIES = [
+    """
+    SELECT m.email, card_no, name, phone, brand_mask,
+        (SELECT json_object_agg(brand, segment ORDER BY brand) FROM master_email_segments s WHERE s.email = m.email)::text
+    FROM master_emails m ORDER BY m.email
+    """,
+    "SELECT kind, brand, value, count FROM audience_stats ORDER BY kind, brand, value",
+]
+
+
+def snapshot():
+    from backend_app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = []
+        for sql in SNAPSHOT_QUERIES:
+            rows += db.execute(text(sql)).all()
+        for code, _ in DEFAULT_BRANDS:
+            rows += db.execute(text(f"SELECT email, card_no, brand, name, phone, segment FROM {brand_table(code)} ORDER BY email")).all()
+        return rows
+    finally:
+        db.close()
+
+
+def timed_post(client, path, **kwargs):
+    started = time.perf_counter()
+    response = client.post(path, **kwargs)
+    if response.status_code >= 400:
+        raise SystemExit(f"POST {path} -> {response.status_code}: {response.text[:500]}")
+    return response.json(), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="rows per brand file")
+    parser.add_argument("--mode", choices=["stream", "delta"], default="stream")
+    parser.add_argument("--overlap", type=float, default=0.5, help="share of customers each brand has in common")
+    parser.add_argument("--data-dir", default=None)
+    parser.add_argument("--reset", action="store_true", help="truncate the app tables between runs (required)")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("this benchmark empties the app tables; pass --reset to confirm")
+
+    from fastapi.testclient import TestClient
+
+    from backend_app.main import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = args.data_dir or tmp
+        files = []
+        for i, (code, name) in enumerate(DEFAULT_BRANDS):
+            path = os.path.join(out_dir, f"brand_{code.lower()}.csv")
+            generate_brand_csv(path, args.rows, seed=i + 1, id_offset=int(i * args.rows * (1 - args.overlap)))
+            files.append((name, path))
+
+        with TestClient(app) as client:
+            reset_database()
+            per_file = {}
+            sequential_started = time.perf_counter()
+            for name, path in files:
+                with open(path, "rb") as f:
+                    _, per_file[name] = timed_post(
+                        client, "/upload", data={"brand": name, "mode": args.mode}, files={"file": (os.path.basename(path), f)}
+                    )
+            sequential_seconds = time.perf_counter() - sequential_started
+            sequential = snapshot()
+
+            reset_database()
+            handles = [open(path, "rb") for _, path in files]
+            try:
+                body, batch_seconds = timed_post(
+                    client, "/upload/batch",
+                    data={"brands": [name for name, _ in files], "mode": args.mode},
+                    files=[("files", (os.path.basename(path), f, "text/csv")) for (_, path), f in zip(files, handles)],
+                )
+            finally:
+                for f in handles:
+                    f.close()
+            identical = snapshot() == sequential
+
+    print(json.dumps({
+        "rows_per_file": args.rows,
+        "mode": args.mode,
+        "files": len(files),
+        "sequential_seconds": round(sequential_seconds, 2),
+        "slowest_file_seconds": round(max(per_file.values()), 2),
+        "batch_seconds": round(batch_seconds, 2),
+        "speedup": round(sequential_seconds / batch_seconds, 2),
+        "batch_status": body["status"],
+        "batch_timings": body["timings"],
+        "identical": identical,
+    }, indent=2))
+    if not identical:
+        raise SystemExit("batch upload left different tables than sequential uploads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Synthetic brand CSVs and suppression lists for the benchmarks.
+
+Brand files use the column aliases ``normalize_and_map_columns``
+understands, so the same headers real exports arrive with get exercised.
+Each file mixes unique customers, in-file duplicates (re-cased and padded
+so they only collide after normalization), invalid emails of every kind
+the validator rejects, and emails that also appear on the suppression
+list written alongside it.
+
+    python -m benchmarks.datasets --rows 1000000 --out /tmp/bench
+"""
+import argparse
+import os
+import random
+import time
+
+# (card_no, brand, name, phone, email, segment) header variants
+HEADER_STYLES = {
+    "canonical": ["card_no", "brand", "name", "phone", "email", "segment"],
+    "export": ["Card No", "Restaurant", "Full Name", "Mobile", "Email Address", "Segment"],
+    "crm": ["CardNum", "Outlet", "Customer Name", "Mobile Number", "E-mail", "Segment Group"],
+    "legacy": ["card_number", "brand", "customer_name", "contact", "email_address", "group"],
+}
+
+DOMAINS = ["gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "icloud.com", "example.com", "example.org"]
+SEGMENTS = ["Gold", "Silver", "Bronze", "VIP", "Regular", "Lapsed"]
+
+# One generator per rejection rule, so every validation path is hit
+INVALID_EMAILS = [
+    lambda n: "",
+    lambda n: "n/a",
+    lambda n: f"user{n}.example.com",
+    lambda n: f"user{n}@@example.com",
+    lambda n: f"user{n}@gmial.com",
+    lambda n: f"user{n}@hotmial.com",
+    lambda n: f"user{n}@mailinator.com",
+    lambda n: f"user{n}@yopmail.com",
+]
+
+CHUNK_ROWS = 100_000
+
+
+def customer_email(n):
+    return f"customer{n}@{DOMAINS[n % len(DOMAINS)]}"
+
+
+def suppressed_email(n):
+    return f"suppressed{n}@{DOMAINS[n % len(DOMAINS)]}"
+
+
+def _dirty(email, rng):
+    """Same address as written by a careless data entry clerk."""
+    choice = rng.random()
+    if choice < 0.4:
+        return email.upper()
+    if choice < 0.7:
+        return f"  {email} "
+    return email.capitalize()
+
+
+def _csv_field(value):
+    if any(c in value for c in ',"\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def generate_brand_csv(path, rows, duplicate_ratio=0.05, invalid_ratio=0.02,
+                       suppressed_ratio=0.01, header_style="export", seed=1, id_offset=0):
+    """Write a brand CSV of ``rows`` rows and return what went into it.
+
+    Ratios are fractions of ``rows``. Duplicates repeat an earlier
+    customer's email; suppressed rows reuse the first addresses written
+    by ``generate_suppression_csv``, so the two files line up.
+    ``id_offset`` shifts customer numbers, e.g. to give another brand an
+    overlapping customer base.
+    """
+    rng = random.Random(seed)
+    counts = {"rows": rows, "unique": 0, "duplicates": 0, "invalid": 0, "suppressed": 0}
+    buffer = []
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(HEADER_STYLES[header_style]) + "\n")
+        for i in range(rows):
+            roll = rng.random()
+            if roll < invalid_ratio:
+                email = rng.choice(INVALID_EMAILS)(i)
+                counts["invalid"] += 1
+            elif roll < invalid_ratio + suppressed_ratio:
+                email = suppressed_email(rng.randrange(max(1, int(rows * suppressed_ratio))))
+                counts["suppressed"] += 1
+            elif roll < invalid_ratio + suppressed_ratio + duplicate_ratio and counts["unique"]:
+                email = _dirty(customer_email(id_offset + rng.randrange(counts["unique"])), rng)
+                counts["duplicates"] += 1
+            else:
+                email = customer_email(id_offset + counts["unique"])
+                counts["unique"] += 1
+
+            card_no = f"{id_offset + i:010d}"
+            buffer.append(",".join([
+                card_no, "bench", f"Customer {id_offset + i}", f"01{rng.randrange(10**8):08d}",
+                _csv_field(email), rng.choice(SEGMENTS),
+            ]))
+            if len(buffer) >= CHUNK_ROWS:
+                f.write("\n".join(buffer) + "\n")
+                buffer = []
+        if buffer:
+            f.write("\n".join(buffer) + "\n")
+
+    counts["bytes"] = os.path.getsize(path)
+    return counts
+
+
+def generate_suppression_csv(path, rows, seed=1):
+    """Write an invalid-email list whose first entries the brand files reuse."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("email\n")
+        for start in range(0, rows, CHUNK_ROWS):
+            batch = [suppressed_email(n) for n in range(start, min(rows, start + CHUNK_ROWS))]
+            # A few entries arrive dirty, like real bounce lists
+            for j in range(0, len(batch), 97):
+                batch[j] = _dirty(batch[j], rng)
+            f.write("\n".join(batch) + "\n")
+    return {"rows": rows, "bytes": os.path.getsize(path)}
+
+
+def generate_dataset(out_dir, rows, duplicate_ratio=0.05, invalid_ratio=0.02,
+                     suppressed_ratio=0.01, suppression_rows=None, header_style="export", seed=1):
+    """Brand CSV plus suppression list in ``out_dir``; returns paths and counts."""
+    os.makedirs(out_dir, exist_ok=True)
+    if suppression_rows is None:
+        suppression_rows = max(1000, int(rows * suppressed_ratio) * 2)
+
+    brand_path = os.path.join(out_dir, f"brand_{rows}.csv")
+    suppression_path = os.path.join(out_dir, f"suppression_{suppression_rows}.csv")
+    return {
+        "brand_csv": brand_path,
+        "suppression_csv": suppression_path,
+        "brand": generate_brand_csv(
+            brand_path, rows, duplicate_ratio=duplicate_ratio, invalid_ratio=invalid_ratio,
+            suppressed_ratio=suppressed_ratio, header_style=header_style, seed=seed
+        ),
+        "suppression": generate_suppression_csv(suppression_path, suppression_rows, seed=seed),
+    }
+
+
+def add_dataset_arguments(parser):
+    parser.add_argument("--rows", type=int, default=100_000, help="brand CSV rows (10k-10M)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05)
+    parser.add_argument("--invalid-ratio", type=float, default=0.02)
+    parser.add_argument("--suppressed-ratio", type=float, default=0.01)
+    parser.add_argument("--suppression-rows", type=int, default=None,
+                        help="invalid-email list size (default: twice the suppressed rows)")
+    parser.add_argument("--headers", choices=sorted(HEADER_STYLES), default="export")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def dataset_from_args(args, out_dir):
+    return generate_dataset(
+        out_dir, args.rows, duplicate_ratio=args.duplicate_ratio, invalid_ratio=args.invalid_ratio,
+        suppressed_ratio=args.suppressed_ratio, suppression_rows=args.suppression_rows,
+        header_style=args.headers, seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_arguments(parser)
+    parser.add_argument("--out", default="bench_data")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = dataset_from_args(args, args.out)
+    print(f"Generated in {time.perf_counter() - started:.1f}s")
+    for key in ("brand_csv", "suppression_csv"):
+        print(f"  {dataset[key]}")
+    print(f"  brand: {dataset['brand']}")
+    print(f"  suppression: {dataset['suppression']}")
+
+
+if __name__ == "__main__":
+    main()
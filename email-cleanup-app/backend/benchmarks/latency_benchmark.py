@@ -0,0 +1,86 @@
+"""Read latency while an upload is running.
+
+Points at a running server (e.g. ``uvicorn backend_app.main:app --workers 4``),
+measures ``/`` and a ``/master-emails`` page while idle, then again while
+a large /upload is in flight, and prints p50/p99 for each phase.
+
+    python -m benchmarks.latency_benchmark --url http://localhost:8001 --csv big.csv
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import httpx
+
+READ_PATHS = [
+    ("root", "/", {}),
+    ("master_page", "/master-emails", {"limit": 100}),
+]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def sample_reads(client, duration, stop=None):
+    latencies = {name: [] for name, _, _ in READ_PATHS}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline and not (stop and stop.is_set()):
+        for name, path, params in READ_PATHS:
+            started = time.perf_counter()
+            client.get(path, params=params).raise_for_status()
+            latencies[name].append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    return {
+        name: {
+            "requests": len(samples),
+            "p50_ms": round(percentile(samples, 50), 2) if samples else None,
+            "p99_ms": round(percentile(samples, 99), 2) if samples else None,
+            "mean_ms": round(statistics.fmean(samples), 2) if samples else None,
+        }
+        for name, samples in latencies.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--csv", required=True, help="brand CSV to upload during the measurement")
+    parser.add_argument("--brand", default="Tony Romas")
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--max-seconds", type=float, default=120.0)
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.url, timeout=600) as client:
+        idle = summarize(sample_reads(client, args.idle_seconds))
+
+        upload = {}
+        done = threading.Event()
+
+        def run_upload():
+            started = time.perf_counter()
+            with open(args.csv, "rb") as f, httpx.Client(base_url=args.url, timeout=None) as uploader:
+                response = uploader.post("/upload", data={"brand": args.brand}, files={"file": (args.csv, f)})
+            upload["status_code"] = response.status_code
+            upload["seconds"] = round(time.perf_counter() - started, 2)
+            done.set()
+
+        thread = threading.Thread(target=run_upload)
+        thread.start()
+        busy = summarize(sample_reads(client, args.max_seconds, stop=done))
+        thread.join()
+
+    print(json.dumps({"idle": idle, "during_upload": busy, "upload": upload}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
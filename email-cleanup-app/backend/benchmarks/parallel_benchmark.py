@@ -0,0 +1,82 @@
+"""Serial vs process-pool parsing and validation of one upload.
+
+Generates a brand CSV and suppression list, then runs
+``iter_prepared_chunks`` (parse, map columns, normalize, validate; no
+database) with 1 worker and with each ``--workers`` count. Every parallel
+run must produce exactly the serial output (same rows, order, values,
+rejection reasons and counts) or the script exits non-zero. Prints
+seconds, rows/sec, speedup over serial and efficiency per worker.
+
+    python -m benchmarks.parallel_benchmark --rows 10000000 --workers 2 4 8 16
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.datasets import add_dataset_arguments, dataset_from_args
+from backend_app.cleaning import normalize_emails
+from backend_app.pipeline import iter_prepared_chunks
+from backend_app.validation import merge_counts, rules_for
+
+BRAND = "Tony Romas"
+
+
+def load_suppressed(path):
+    return set(normalize_emails(pd.read_csv(path, dtype=str)["email"]).dropna())
+
+
+def run(path, rules, suppressed, workers):
+    """Prepared output of one run as a single frame, plus counts and seconds."""
+    started = time.perf_counter()
+    frames, counts = [], {}
+    with open(path, "rb") as f:
+        # min_bytes=0: use the pool whatever the file size
+        chunks = iter_prepared_chunks(f, rules, suppressed, workers=workers, min_bytes=0)
+        for chunk, rejected_by, chunk_counts in chunks:
+            frames.append(chunk.assign(rejected_by=rejected_by))
+            merge_counts(counts, chunk_counts)
+    seconds = time.perf_counter() - started
+    return pd.concat(frames, ignore_index=True), counts, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_arguments(parser)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--data-dir", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = dataset_from_args(args, args.data_dir or tmp)
+        rules = rules_for(BRAND)
+        suppressed = load_suppressed(dataset["suppression_csv"])
+
+        serial, serial_counts, serial_seconds = run(dataset["brand_csv"], rules, suppressed, workers=1)
+        rows = len(serial)
+        results = [{
+            "workers": 1, "seconds": round(serial_seconds, 3), "rows_per_sec": round(rows / serial_seconds),
+            "speedup": 1.0, "efficiency": 1.0, "identical": True,
+        }]
+
+        mismatches = 0
+        for workers in sorted(set(w for w in args.workers if w > 1)):
+            output, counts, seconds = run(dataset["brand_csv"], rules, suppressed, workers=workers)
+            identical = output.equals(serial) and counts == serial_counts
+            mismatches += not identical
+            speedup = serial_seconds / seconds
+            results.append({
+                "workers": workers, "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds),
+                "speedup": round(speedup, 2), "efficiency": round(speedup / workers, 2), "identical": identical,
+            })
+
+    print(json.dumps({"rows": rows, "cpus": os.cpu_count(), "rejections": serial_counts, "runs": results}, indent=2))
+    if mismatches:
+        raise SystemExit(f"{mismatches} parallel run(s) differ from the serial output")
+
+
+if __name__ == "__main__":
+    main()
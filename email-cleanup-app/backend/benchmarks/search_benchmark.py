@@ -0,0 +1,136 @@
+"""Search latency on a large master_emails table.
+
+Seeds synthetic rows (emails ``bench-<n>@...``) if asked, then runs the
+/master-emails filter combinations through EXPLAIN ANALYZE and reports
+execution time, whether any node is a sequential scan on master_emails,
+and whether the query met the latency budget.
+
+    python -m benchmarks.search_benchmark --seed 3000000
+    python -m benchmarks.search_benchmark --cleanup
+"""
+import argparse
+import json
+import time
+
+from sqlalchemy import text
+
+from backend_app.database import SessionLocal, init_db
+from backend_app.models import MasterEmail
+from backend_app.search import filter_master
+from backend_app.stats import rebuild_stats
+
+CASES = [
+    {"search": "bench-1234567"},
+    {"search": "example42"},
+    {"segment": "VIP"},
+    {"segment": "TR_Gold", "brand": "TR"},
+    {"search": "bench-99", "segment": "Silver"},
+    {"include": "TR,MFM", "exclude": "NYSS"},
+    {"include": "NYSS", "exclude": "TR"},
+]
+
+
+def seed(db, rows):
+    started = time.perf_counter()
+    db.execute(text("""
+        INSERT INTO master_emails (email, card_no, name, phone, brand_mask, last_updated)
+        SELECT
+            'bench-' || g || '@example' || (g % 997) || '.com',
+            LPAD(g::text, 10, '0'), 'Bench ' || g, '01' || g,
+            (CASE WHEN g % 2 = 0 THEN 1 ELSE 0 END)
+                | (CASE WHEN g % 3 = 0 THEN 2 ELSE 0 END)
+                | (CASE WHEN g % 5 = 0 THEN 4 ELSE 0 END),
+            NOW() - (g || ' seconds')::interval
+        FROM generate_series(1, :rows) g
+        ON CONFLICT (email) DO NOTHING
+    """), {"rows": rows})
+    db.execute(text("""
+        INSERT INTO master_email_segments (email, brand, segment)
+        SELECT 'bench-' || g || '@example' || (g % 997) || '.com', s.brand, s.segment
+        FROM generate_series(1, :rows) g
+        CROSS JOIN LATERAL (VALUES
+            ('TR', CASE WHEN g % 2 = 0 THEN 'TR_' || (ARRAY['Gold', 'Silver', 'Bronze'])[g % 3 + 1] END),
+            ('MFM', CASE WHEN g % 3 = 0 THEN 'MFM_' || (ARRAY['Gold', 'Silver', 'VIP'])[g % 3 + 1] END),
+            ('NYSS', CASE WHEN g % 5 = 0 THEN 'NYSS_' || (ARRAY['Regular', 'Lapsed'])[g % 2 + 1] END)
+        ) AS s (brand, segment)
+        WHERE s.segment IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """), {"rows": rows})
+    rebuild_stats(db)
+    db.commit()
+    db.execute(text("ANALYZE master_emails"))
+    db.execute(text("ANALYZE master_email_segments"))
+    db.commit()
+    print(f"Seeded {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+def explain(db, query):
+    compiled = query.statement.compile(dialect=db.get_bind().dialect)
+    plan = db.connection().exec_driver_sql(
+        f"EXPLAIN (ANALYZE, FORMAT JSON) {compiled}", compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def node_types(node):
+    yield node["Node Type"], node.get("Relation Name")
+    for child in node.get("Plans", []):
+        yield from node_types(child)
+
+
+def run(db, budget_ms):
+    results = []
+    for case in CASES:
+        base = filter_master(db.query(MasterEmail), **case)
+        page = base.order_by(MasterEmail.last_updated.desc(), MasterEmail.email.desc()).limit(100)
+        for label, query in (("page", page), ("count", base.with_entities(MasterEmail.email))):
+            plan = explain(db, query)
+            nodes = list(node_types(plan["Plan"]))
+            seq_scan = any(t == "Seq Scan" and rel == "master_emails" for t, rel in nodes)
+            elapsed = plan["Execution Time"]
+            results.append({
+                "filters": case,
+                "query": label,
+                "execution_ms": round(elapsed, 2),
+                "seq_scan": seq_scan,
+                "within_budget": elapsed <= budget_ms,
+            })
+            print(f"{label:5} {json.dumps(case):45} {elapsed:9.2f} ms  seq_scan={seq_scan}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="insert this many synthetic rows first")
+    parser.add_argument("--cleanup", action="store_true", help="delete the synthetic rows and exit")
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.cleanup:
+            deleted = db.execute(text("DELETE FROM master_emails WHERE email LIKE 'bench-%'")).rowcount
+            db.execute(text("DELETE FROM master_email_segments WHERE email LIKE 'bench-%'"))
+            rebuild_stats(db)
+            db.commit()
+            print(f"Deleted {deleted} rows")
+            return
+        if args.seed:
+            seed(db, args.seed)
+
+        total = db.execute(text("SELECT COUNT(*) FROM master_emails")).scalar()
+        print(f"master_emails rows: {total}")
+        results = run(db, args.budget_ms)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"rows": total, "budget_ms": args.budget_ms, "results": results}, f, indent=2)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
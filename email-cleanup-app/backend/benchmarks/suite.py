@@ -0,0 +1,329 @@
+"""End-to-end throughput of the cleanup endpoints.
+
+Generates a dataset (see ``benchmarks.datasets``), then times, in order:
+
+    invalid_upload   POST /invalid-emails/upload with the suppression list
+    validate         POST /validate-emails with the brand CSV
+    upload           POST /upload (streaming pipeline) with the brand CSV
+    merge            POST /merge-into-master (full rebuild)
+    master_pages     GET /master-emails, following next_cursor
+    invalid_pages    GET /invalid-emails, following next_cursor
+
+and reports rows/sec, p50/p99 latency and peak RSS for each. By default
+the app runs in-process against the database configured by the usual
+POSTGRES_* variables; ``--url`` targets a running server instead (pass
+``--server-pid`` to sample its memory).
+
+Results are written as JSON so a later run can be checked against them:
+
+    python -m benchmarks.suite --rows 100000 --reset --output benchmarks/baselines/100k.json
+    python -m benchmarks.suite --rows 100000 --reset --compare benchmarks/baselines/100k.json
+
+``--reset`` empties the brand, master and invalid-email tables first, so
+only use it against a throwaway database.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.datasets import add_dataset_arguments, dataset_from_args
+from benchmarks.latency_benchmark import percentile
+
+BRAND = "Tony Romas"
+SCENARIOS = ["invalid_upload", "validate", "upload", "merge", "master_pages", "invalid_pages"]
+
+# metric -> True when a larger value is better
+COMPARED_METRICS = {"rows_per_sec": True, "p99_ms": False, "peak_rss_mb": False}
+
+
+class RssSampler:
+    """Track the peak resident set size of a process while a block runs.
+
+    Reads /proc/<pid>/statm every ``interval`` seconds. Where /proc is not
+    available it falls back to getrusage, which only knows the lifetime
+    peak of this process. With ``enabled=False`` nothing is sampled and the
+    peak is reported as None (a remote server we have no pid for).
+    """
+
+    def __init__(self, pid=None, interval=0.05, enabled=True):
+        self.pid = pid or os.getpid()
+        self.enabled = enabled
+        self.interval = interval
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _rss(self):
+        try:
+            with open(f"/proc/{self.pid}/statm") as f:
+                return int(f.read().split()[1]) * self.page_size
+        except OSError:
+            if self.pid != os.getpid():
+                return 0
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            scale = 1 if sys.platform == "darwin" else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self.peak = self._rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.enabled:
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / 2**20, 1) if self.enabled else None
+
+
+def summarize(rows, latencies_ms, rss):
+    total_seconds = sum(latencies_ms) / 1000
+    return {
+        "rows": rows,
+        "requests": len(latencies_ms),
+        "seconds": round(total_seconds, 3),
+        "rows_per_sec": round(rows / total_seconds, 1) if total_seconds else None,
+        "p50_ms": round(percentile(latencies_ms, 50), 2) if latencies_ms else None,
+        "p99_ms": round(percentile(latencies_ms, 99), 2) if latencies_ms else None,
+        "peak_rss_mb": rss.peak_mb,
+    }
+
+
+def timed(call):
+    started = time.perf_counter()
+    response = call()
+    elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url} -> {response.status_code}: {response.text[:500]}")
+    return response, elapsed
+
+
+def post_file(client, path, csv_path, **data):
+    with open(csv_path, "rb") as f:
+        return client.post(path, data=data, files={"file": (os.path.basename(csv_path), f, "text/csv")})
+
+
+def run_uploads(client, path, csv_path, rows, repeat, rss, **data):
+    latencies = []
+    with rss:
+        for _ in range(repeat):
+            response, elapsed = timed(lambda: post_file(client, path, csv_path, **data))
+            latencies.append(elapsed)
+    return summarize(rows * repeat, latencies, rss), response.json()
+
+
+def run_pages(client, path, page_size, max_pages, rss):
+    latencies = []
+    rows = 0
+    cursor = None
+    with rss:
+        for _ in range(max_pages):
+            params = {"limit": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            response, elapsed = timed(lambda: client.get(path, params=params))
+            latencies.append(elapsed)
+            body = response.json()
+            rows += len(body["data"])
+            cursor = body.get("next_cursor")
+            if not cursor:
+                break
+    return summarize(rows, latencies, rss)
+
+
+def run_suite(client, dataset, args, rss):
+    brand_rows = dataset["brand"]["rows"]
+    results = {}
+    details = {}
+
+    def enabled(name):
+        return name not in args.skip
+
+    if enabled("invalid_upload"):
+        results["invalid_upload"], details["invalid_upload"] = run_uploads(
+            client, "/invalid-emails/upload", dataset["suppression_csv"], dataset["suppression"]["rows"],
+            args.repeat, rss, brand=BRAND
+        )
+    if enabled("validate"):
+        results["validate"], body = run_uploads(
+            client, "/validate-emails", dataset["brand_csv"], brand_rows, args.repeat, rss, brand=BRAND
+        )
+        details["validate"] = {key: body.get(key) for key in ("total", "valid_count", "invalid_count", "rejections")}
+    if enabled("upload"):
+        results["upload"], body = run_uploads(
+            client, "/upload", dataset["brand_csv"], brand_rows, args.repeat, rss, brand=BRAND, mode="stream"
+        )
+        details["upload"] = {key: body.get(key) for key in (
+            "rows_uploaded", "rows_after_invalid_removal", "invalid_count", "chunks", "rejections", "timings", "merge_result"
+        )}
+    if enabled("merge"):
+        latencies = []
+        with rss:
+            for _ in range(args.repeat):
+                response, elapsed = timed(lambda: client.post("/merge-into-master"))
+                latencies.append(elapsed)
+        details["merge"] = response.json()
+        # Every merged email is recomputed, written or not
+        merged = sum(details["merge"][key] for key in ("inserted", "updated", "unchanged"))
+        results["merge"] = summarize(merged * args.repeat, latencies, rss)
+    if enabled("master_pages"):
+        results["master_pages"] = run_pages(client, "/master-emails", args.page_size, args.pages, rss)
+    if enabled("invalid_pages"):
+        results["invalid_pages"] = run_pages(client, "/invalid-emails", args.page_size, args.pages, rss)
+    return results, details
+
+
+def reset_database():
+    from sqlalchemy import text
+
+    from backend_app.brands import brand_registry
+    from backend_app.database import SessionLocal, ensure_schema
+    from backend_app.merge import MASTER_VERSION
+    from backend_app.stats import rebuild_stats
+    from backend_app.suppression import SUPPRESSION_VERSION
+    from backend_app.versions import bump_version
+
+    if not ensure_schema():
+        raise SystemExit("Database is not reachable.")
+    db = SessionLocal()
+    try:
+        # Every registered brand, including ones added through POST /brands;
+        # stored upload results would otherwise replay into the emptied tables
+        brand_tables = ", ".join(brand.table for brand in brand_registry.all(db))
+        db.execute(text(
+            f"TRUNCATE {brand_tables}, master_emails, master_email_segments, invalid_emails, "
+            "upload_fingerprints, pending_merges"
+        ))
+        # Suppression caches and /master-emails ETags key off these counters
+        bump_version(db, SUPPRESSION_VERSION)
+        bump_version(db, MASTER_VERSION)
+        rebuild_stats(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (scenario, metric, baseline, current, change) plus regressions."""
+    rows, regressions = [], []
+    for scenario, current in results.items():
+        previous = baseline.get("results", {}).get(scenario)
+        if not previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            rows.append((scenario, metric, old, new, change))
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append((scenario, metric, old, new, change))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_dataset_arguments(parser)
+    parser.add_argument("--data-dir", default=None, help="where to write the dataset (default: a temp dir)")
+    parser.add_argument("--url", default=None, help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--server-pid", type=int, default=None, help="process to sample RSS from with --url")
+    parser.add_argument("--repeat", type=int, default=1, help="requests per upload/merge scenario")
+    parser.add_argument("--pages", type=int, default=200, help="maximum pages per read scenario")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--skip", nargs="*", default=[], choices=SCENARIOS)
+    parser.add_argument("--reset", action="store_true", help="truncate the app tables before running")
+    parser.add_argument("--output", default=None, help="write the results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline JSON to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        dataset = dataset_from_args(args, args.data_dir or tmp)
+        print(f"Dataset ready in {time.perf_counter() - started:.1f}s: {dataset['brand']}", file=sys.stderr)
+
+        if args.reset:
+            reset_database()
+
+        if args.url:
+            import httpx
+
+            rss = RssSampler(pid=args.server_pid, enabled=bool(args.server_pid))
+            with httpx.Client(base_url=args.url, timeout=None) as client:
+                results, details = run_suite(client, dataset, args, rss)
+        else:
+            from fastapi.testclient import TestClient
+
+            from backend_app.main import app
+
+            with TestClient(app) as client:
+                results, details = run_suite(client, dataset, args, RssSampler())
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "target": args.url or "in-process",
+        "dataset": {
+            "rows": args.rows, "duplicate_ratio": args.duplicate_ratio, "invalid_ratio": args.invalid_ratio,
+            "suppressed_ratio": args.suppressed_ratio, "headers": args.headers, "seed": args.seed,
+            "brand": dataset["brand"], "suppression": dataset["suppression"],
+        },
+        "results": results,
+        "details": details,
+    }
+
+    print(json.dumps(report, indent=2, default=str))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.tolerance)
+        print(f"\nCompared with {args.compare} ({baseline.get('git_revision')}):", file=sys.stderr)
+        for scenario, metric, old, new, change in rows:
+            flag = "  REGRESSION" if (scenario, metric, old, new, change) in regressions else ""
+            print(f"  {scenario:15} {metric:12} {old:>12} -> {new:>12} ({change:+.1%}){flag}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Row-by-row vs bulk master writes in /transform-cleaned-data.
+
+Generates two brand CSVs with overlapping customers, then for each
+``mode`` ("row": one INSERT ... ON CONFLICT per row, "bulk": COPY into a
+staging table plus one set-based upsert) empties the database and runs
+the transform for the first brand (mostly inserts) and the second
+(mostly updates of the shared customers). The master list and its
+segments must come out identical in both modes (last_updated aside) or
+the script exits non-zero. Prints seconds and rows/sec per step.
+
+    python -m benchmarks.transform_benchmark --rows 50000 --reset
+
+Each run starts from empty brand, master and invalid-email tables, so
+the script refuses to run without ``--reset``: only pass it against a
+throwaway database.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from benchmarks.datasets import generate_brand_csv
+from benchmarks.suite import reset_database
+
+BRANDS = ["Tony Romas", "The Manhattan Fish Market"]
+MODES = ["row", "bulk"]
+
+
+def snapshot():
+    from backend_app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.execute(text("""
+            SELECT m.email, card_no, name, phone, brand_mask,
+                (SELECT json_object_agg(brand, segment ORDER BY brand) FROM master_email_segments s WHERE s.email = m.email)::text
+            FROM master_emails m ORDER BY m.email
+        """)).all()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per brand file")
+    parser.add_argument("--overlap", type=float, default=0.5, help="share of customers the brands have in common")
+    parser.add_argument("--reset", action="store_true", help="truncate the app tables between runs (required)")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("this benchmark empties the app tables; pass --reset to confirm")
+
+    from fastapi.testclient import TestClient
+
+    from backend_app.main import UPLOAD_FOLDER, app
+
+    filenames = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, brand in enumerate(BRANDS):
+            path = os.path.join(tmp, f"transform_benchmark_{i}.csv")
+            generate_brand_csv(path, args.rows, invalid_ratio=0, suppressed_ratio=0, seed=i + 1,
+                               id_offset=int(i * args.rows * (1 - args.overlap)))
+            filenames.append(os.path.basename(path))
+            shutil.copy(path, os.path.join(UPLOAD_FOLDER, filenames[-1]))
+
+    runs, snapshots = [], {}
+    try:
+        with TestClient(app) as client:
+            for mode in MODES:
+                reset_database()
+                for brand, filename in zip(BRANDS, filenames):
+                    started = time.perf_counter()
+                    response = client.post(
+                        "/transform-cleaned-data", data={"filename": filename, "brand": brand, "mode": mode}
+                    )
+                    seconds = time.perf_counter() - started
+                    if response.status_code >= 400:
+                        raise SystemExit(f"{mode} {brand}: {response.status_code} {response.text[:500]}")
+                    runs.append({
+                        "mode": mode, "brand": brand, "seconds": round(seconds, 3),
+                        "rows_per_sec": round(args.rows / seconds),
+                    })
+                snapshots[mode] = snapshot()
+    finally:
+        for filename in filenames:
+            for name in (filename, f"transformed_{os.path.splitext(filename)[0]}.parquet"):
+                if os.path.exists(os.path.join(UPLOAD_FOLDER, name)):
+                    os.remove(os.path.join(UPLOAD_FOLDER, name))
+
+    totals = {mode: sum(run["seconds"] for run in runs if run["mode"] == mode) for mode in MODES}
+    identical = snapshots["row"] == snapshots["bulk"]
+    print(json.dumps({
+        "rows_per_file": args.rows,
+        "runs": runs,
+        "seconds": {mode: round(seconds, 3) for mode, seconds in totals.items()},
+        "speedup": round(totals["row"] / totals["bulk"], 1),
+        "identical": identical,
+    }, indent=2))
+    if not identical:
+        raise SystemExit("bulk master writes differ from the row-by-row ones")
+
+
+if __name__ == "__main__":
+    main()